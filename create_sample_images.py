@@ -1,56 +1,165 @@
+import argparse
+import hashlib
+import io
+import json
 import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 
 from btcticker.config import Config
 from btcticker.ticker import Ticker
 
-logger = logging.getLogger(__name__)
-
-
-config = Config("home.admin/config.ini")
-
-w = 176
-h = 264
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "home.admin")
+)
 
-ticker = Ticker(config, w, h)
-# ticker.price.enable_ohlc = True
-ticker.price.enable_ohlc = False
-# ticker.orientation = 0
+import ticker_chart  # noqa: E402
+from ticker_archive import install_archive  # noqa: E402
+from ticker_config import load_daemon_config  # noqa: E402
+from ticker_epd import PANELS, display_size  # noqa: E402
+from ticker_refresh import (  # noqa: E402
+    RefreshWorker,
+    SnapshotMempool,
+    SnapshotPriceProvider,
+    set_snapshot,
+)
 
-ticker.set_days_ago(3)
-ticker.refresh()
+logger = logging.getLogger(__name__)
 
 mode_list = "fiat,height,satfiat,moscowtime,usd".split(",")
 layout_list = "all,fiat,fiatheight,big_one_row,one_number,big_two_rows,mempool".split(
     ","
 )
-# layout_list = ["big_one_row"]
-# layout_list = ["one_number"]
-# layout_list = ["big_two_rows"]
-# layout_list = ["mempool"]
-# layout_list = ["fiatheight"]
-# layout_list = ["fiat"]
-# layout_list = ["all"]
-# layout_list = ["mempool"]
-# layout_list = ["ohlc"]
-size_list = [
-    # (122, 250, 0),
-    (176, 264, 0),
-    # (128, 296, 0),
-    (280, 480, 0),
-    # (480, 800, 0),
-    # (800, 480, 0),
-]
-
-for h, w, o in size_list:
-    ticker.change_size(w, h)
+DAYS_AGO = 3
+
+# The config of a worker process
+_config = None
+
+
+def sample_sizes(epd_types, orientations):
+    """Ticker sizes of the panels, every size is only rendered once."""
+    sizes = {}
+    for epd_type in epd_types:
+        for o in orientations:
+            w, h = display_size(PANELS[epd_type], o)
+            sizes.setdefault((w, h, o), []).append(epd_type)
+    return sizes
+
+
+def init_worker(config_path):
+    global _config
+    _config = Config(config_path)
+    if load_daemon_config(_config).chart_engine == "native":
+        ticker_chart.install()
+
+
+def render_size(w, h, o, snapshot, output):
+    """Render and save all layouts and modes of one size, return their
+    manifest entries."""
+    ticker = Ticker(
+        _config,
+        w,
+        h,
+        mempool=SnapshotMempool(),
+        price_provider=SnapshotPriceProvider(),
+    )
     ticker.orientation = o
+    set_snapshot(ticker, snapshot)
+    ticker.set_days_ago(DAYS_AGO)
+    entries = []
     for layout in layout_list:
         for mode in mode_list:
-            print(
-                f"Creating image for h: {h}, w: {w}, "
-                f"o: {o} with mode: {mode} layout: {layout}"
-            )
-            ticker.build(mirror=False, mode=mode, layout=layout)
-            ticker.get_image().save(
-                f"./sample_images/{w}_{h}_{o}_{mode}_{layout}.PNG", format="PNG"
-            )
+            name = f"{w}_{h}_{o}_{mode}_{layout}.PNG"
+            entry = {"file": name, "layout": layout, "mode": mode}
+            start = time.perf_counter()
+            try:
+                ticker.build(mirror=False, mode=mode, layout=layout)
+                image = ticker.get_image()
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+                entries.append(entry)
+                continue
+            entry["render_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            data = io.BytesIO()
+            image.save(data, format="PNG")
+            entry["sha256"] = hashlib.sha256(data.getbuffer()).hexdigest()
+            with open(os.path.join(output, name), "wb") as f:
+                f.write(data.getbuffer())
+            entries.append(entry)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the sample images of all panel sizes in parallel"
+    )
+    parser.add_argument("--config", default="home.admin/config.ini")
+    parser.add_argument("--output", default="./sample_images")
+    parser.add_argument(
+        "--epd-types",
+        help="comma separated panels, by default all of ticker_epd.PANELS",
+    )
+    parser.add_argument(
+        "--orientations", help="e.g. 0,90, by default the one of config.ini"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    install_archive(config)
+    epd_types = args.epd_types.split(",") if args.epd_types else list(PANELS)
+    if args.orientations:
+        orientations = [int(o) for o in args.orientations.split(",")]
+    else:
+        orientations = [config.main.orientation]
+    sizes = sample_sizes(epd_types, orientations)
+
+    # The data is fetched once and rendered by all processes
+    worker = RefreshWorker(config, 0, days_ago=DAYS_AGO)
+    if not worker.refresh():
+        sys.exit(f"Refresh failed: {worker.last_error}")
+    snapshot = worker.get_snapshot()
+
+    os.makedirs(args.output, exist_ok=True)
+    start = time.perf_counter()
+    images = []
+    # Worker processes are not forked from the threads of the refresh
+    with ProcessPoolExecutor(
+        args.workers,
+        mp_context=get_context("spawn"),
+        initializer=init_worker,
+        initargs=(args.config,),
+    ) as pool:
+        futures = {
+            pool.submit(render_size, w, h, o, snapshot, args.output): (w, h, o)
+            for w, h, o in sizes
+        }
+        for future in as_completed(futures):
+            w, h, o = futures[future]
+            entries = future.result()
+            for entry in entries:
+                entry.update(
+                    width=w, height=h, orientation=o, epd_types=sizes[(w, h, o)]
+                )
+            images += entries
+            print(f"{w}x{h} o{o}: {len(entries)} images")
+
+    manifest = {
+        "data": {"timestamp": snapshot.timestamp, "price": snapshot.price_now},
+        "seconds": round(time.perf_counter() - start, 2),
+        "images": sorted(images, key=lambda entry: entry["file"]),
+    }
+    with open(os.path.join(args.output, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+    failed = [entry for entry in images if "error" in entry]
+    for entry in failed:
+        print(f"{entry['file']}: {entry['error']}")
+    print(f"{len(images) - len(failed)} images in {manifest['seconds']} s")
+
+
+if __name__ == "__main__":
+    main()
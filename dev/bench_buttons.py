@@ -0,0 +1,127 @@
+"""Compare the idle cost of the polling and the edge triggered button loop.
+
+Runs on any Linux host, the Raspberry Pi GPIO module is replaced by a fake
+that fires the edge callbacks from its own thread like RPi.GPIO does.
+
+    python dev/bench_buttons.py --seconds 10
+"""
+
+import argparse
+import os
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+from ticker_input import ButtonInput  # noqa: E402
+
+PINS = (5, 6, 13, 19)
+
+
+class FakeGPIO:
+    BCM = 11
+    IN = 1
+    PUD_UP = 22
+    FALLING = 32
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.levels = {}
+        self.callbacks = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None):
+        self.levels[pin] = self.HIGH
+
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def press(self, pin, duration=0.1):
+        self.levels[pin] = self.LOW
+        if pin in self.callbacks:
+            threading.Thread(target=self.callbacks[pin], args=(pin,)).start()
+        time.sleep(duration)
+        self.levels[pin] = self.HIGH
+
+
+def press_buttons(gpio, seconds, presses):
+    for i in range(presses):
+        time.sleep(seconds / (presses + 1))
+        gpio.press(PINS[i % len(PINS)])
+
+
+def polling_loop(gpio, seconds):
+    wakeups = 0
+    pressed = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        wakeups += 1
+        for pin in PINS:
+            if gpio.input(pin) == gpio.LOW:
+                pressed += 1
+                # the old loop spends time in fullupdate after a key press
+                time.sleep(0.2)
+                break
+        else:
+            time.sleep(0.05)
+    return wakeups, pressed
+
+
+def event_loop(gpio, seconds):
+    buttons = ButtonInput(gpio, PINS)
+    buttons.setup()
+    wakeups = 0
+    pressed = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        wakeups += 1
+        if buttons.get(timeout=min(30, max(0.05, end - time.time()))) is not None:
+            pressed += 1
+            time.sleep(0.2)
+    return wakeups, pressed
+
+
+def measure(name, loop, seconds, presses):
+    gpio = FakeGPIO()
+    for pin in PINS:
+        gpio.setup(pin, gpio.IN)
+    presser = threading.Thread(target=press_buttons, args=(gpio, seconds, presses))
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_start = time.process_time()
+    presser.start()
+    wakeups, pressed = loop(gpio, seconds)
+    presser.join()
+    cpu = time.process_time() - cpu_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    switches = (usage_end.ru_nvcsw - usage_start.ru_nvcsw) + (
+        usage_end.ru_nivcsw - usage_start.ru_nivcsw
+    )
+    print(
+        f"{name:8s} cpu: {cpu / seconds * 100:6.3f} %  "
+        f"wakeups: {wakeups / seconds:7.2f} /s  "
+        f"context switches: {switches / seconds:7.2f} /s  "
+        f"presses: {pressed}/{presses}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--presses", type=int, default=4)
+    args = parser.parse_args()
+
+    measure("polling", polling_loop, args.seconds, args.presses)
+    measure("events", event_loop, args.seconds, args.presses)
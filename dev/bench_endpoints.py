@@ -0,0 +1,137 @@
+"""Compare the failover of pymempool with the hedged EndpointSelector.
+
+Three stand-in hosts answer the 8 requests of a mempool refresh after a
+random latency around their median, fail fast or hang until the read
+timeout. The sequential failover tries the hosts in the configured order
+like pymempool, the selector ranks them and hedges slow requests. The
+seconds per refresh are printed for every scenario. --speed runs the
+stand-ins faster, the results are scaled back.
+
+    python dev/bench_endpoints.py --refreshes 10 --speed 10
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+from ticker_endpoints import EndpointSelector  # noqa: E402
+
+API_URLS = "https://a.example/api/,https://b.example/api/,https://c.example/api/"
+# Requests of Mempool.refresh()
+PATHS = (
+    "blocks/tip/hash",
+    "block/hash",
+    "blocks/tip/height",
+    "v1/fees/recommended",
+    "v1/difficulty-adjustment",
+    "v1/fees/mempool-blocks",
+    "block-height/height",
+    "block/hash",
+)
+# Median latency in seconds of the hosts a, b and c, "fail" fails right away,
+# "hang" waits for the read timeout
+SCENARIOS = {
+    "healthy": (0.3, 0.15, 0.5),
+    "first slow": (4.0, 0.2, 0.4),
+    "first hangs": ("hang", 0.2, 0.4),
+    "first two down": ("hang", "fail", 0.4),
+    "offline": ("hang", "hang", "hang"),
+}
+
+
+class StandIn:
+    def __init__(self, latencies, timeout, speed):
+        self.latencies = dict(zip("abc", latencies, strict=True))
+        self.timeout = timeout
+        self.speed = speed
+
+    def request(self, url):
+        latency = self.latencies[urlsplit(url).netloc[0]]
+        if latency == "fail":
+            time.sleep(0.05 / self.speed)
+            raise ConnectionError("Connection refused")
+        if latency == "hang":
+            time.sleep(self.timeout / self.speed)
+            raise TimeoutError("Read timed out")
+        time.sleep(random.lognormvariate(0, 0.5) * latency / self.speed)
+        return {}
+
+
+def sequential(stand_in, path):
+    error = None
+    for url in API_URLS.split(","):
+        try:
+            return stand_in.request(url + path)
+        except Exception as e:
+            error = e
+    raise error
+
+
+def run(latencies, refreshes, timeout, budget, speed):
+    stand_in = StandIn(latencies, timeout, speed)
+    selector = EndpointSelector(
+        API_URLS,
+        min_hedge_delay=0.3 / speed,
+        max_hedge_delay=5.0 / speed,
+        default_latency=1.0 / speed,
+        error_penalty=10.0 / speed,
+        error_half_life=300 / speed,
+    )
+    results = {"sequential": [], "hedged": []}
+    for _ in range(refreshes):
+        start = time.monotonic()
+        try:
+            for path in PATHS:
+                sequential(stand_in, path)
+        except Exception:
+            pass
+        results["sequential"].append((time.monotonic() - start) * speed)
+
+        selector.start_budget(budget / speed)
+        start = time.monotonic()
+        try:
+            for path in PATHS:
+                selector.fetch(
+                    lambda url, path=path: stand_in.request(url + path), path
+                )
+        except Exception:
+            pass
+        results["hedged"].append((time.monotonic() - start) * speed)
+    return results, selector.hedged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--refreshes", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30, help="read timeout")
+    parser.add_argument("--budget", type=float, default=60, help="refresh budget")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<16} {'sequential':>18} {'hedged':>18} {'hedges':>6}")
+    print(f"{'':<16} {'median':>8} {'max':>8} {'median':>9} {'max':>8}")
+    for name, latencies in SCENARIOS.items():
+        results, hedged = run(
+            latencies, args.refreshes, args.timeout, args.budget, args.speed
+        )
+        print(
+            f"{name:<16} "
+            + " ".join(
+                f"{statistics.median(results[kind]):7.2f}s "
+                f"{max(results[kind]):7.2f}s"
+                for kind in ("sequential", "hedged")
+            )
+            + f" {hedged:6d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
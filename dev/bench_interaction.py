@@ -0,0 +1,154 @@
+"""Benchmark the key press latency with and without the interaction window.
+
+The e-paper driver is replaced by a fake that takes as long as the
+waveshare driver: the fixed delays of reset(), init() and sleep() are taken
+from its source, the refresh times from the panel specifications. Key
+presses are simulated by submitting warm frames to a DisplayWriter, a new
+press follows --think seconds after the last frame was written. For every
+press the time until the frame is on the glass and until the writer is
+ready again is measured. --speed runs the fake faster, the results are
+scaled back.
+
+    python dev/bench_interaction.py
+    python dev/bench_interaction.py --presses 5 --speed 10
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+import ticker_epd  # noqa: E402
+from ticker_display import DisplayWriter, EinkDisplay  # noqa: E402
+
+# Seconds spent in the driver calls of the 4 gray paths. reset() waits
+# 200 + 5 + 200 ms, sleep() waits 2000 ms before it releases the GPIOs.
+# init is the busy wait after the power on, transfer the conversion and SPI
+# transfer of the buffer on a Raspberry Pi Zero and refresh the BUSY time
+# of a full refresh.
+TIMINGS = {
+    # epd2in7.py polls BUSY every 200 ms and sends the buffer byte by byte
+    "2in7_4gray": {
+        "reset": 0.405,
+        "init": 0.2,
+        "transfer": 1.2,
+        "refresh": 6.0,
+        "sleep": 2.0,
+    },
+    # epd3in7.py waits 300 ms after the reset and sends the buffer at once
+    "3in7_4gray": {
+        "reset": 0.405,
+        "init": 0.32,
+        "transfer": 0.5,
+        "refresh": 3.0,
+        "sleep": 2.0,
+    },
+}
+
+
+class FakeEPD:
+    """Driver which only takes the time of the real one."""
+
+    FULL_UPDATE = 0
+    PART_UPDATE = 1
+
+    def __init__(self, timings, speed):
+        self.timings = timings
+        self.speed = speed
+        self.inits = 0
+        self.sleeps = 0
+        self.shown = []
+
+    def _wait(self, *names):
+        time.sleep(sum(self.timings[name] for name in names) / self.speed)
+
+    def init(self, *args):
+        self.inits += 1
+        self._wait("reset", "init")
+
+    Init_4Gray = init
+
+    def display_4Gray(self, buffer):
+        self._wait("transfer", "refresh")
+        self.shown.append(time.monotonic())
+
+    display = display_4Gray
+
+    def sleep(self):
+        self.sleeps += 1
+        self._wait("sleep")
+
+
+def frames(epd_type, count):
+    """Distinct frames, so that no write is skipped."""
+    width, height = ticker_epd.display_size(ticker_epd.get_panel(epd_type))
+    images = []
+    for i in range(count):
+        image = Image.new("L", (width, height), 255)
+        ImageDraw.Draw(image).rectangle((4 * i, 4 * i, 4 * i + 40, 4 * i + 40), 0)
+        images.append(image)
+    return images
+
+
+def run(epd_type, window, presses, think, speed):
+    epd = ticker_epd._drivers[epd_type] = FakeEPD(TIMINGS[epd_type], speed)
+    display = EinkDisplay(epd_type)
+    writer = DisplayWriter(display.draw, sleep=display.sleep, warm_time=window / speed)
+    writer.start()
+    to_glass = []
+    to_ready = []
+    for image in frames(epd_type, presses):
+        pressed = time.monotonic()
+        written = threading.Event()
+        writer.submit(image, on_shown=written.set, warm=True)
+        written.wait()
+        to_glass.append((epd.shown[-1] - pressed) * speed)
+        to_ready.append((time.monotonic() - pressed) * speed)
+        time.sleep(think / speed)
+    writer.stop()
+    writer.join()
+    return {
+        "to_glass": to_glass,
+        "to_ready": to_ready,
+        "inits": epd.inits,
+        "sleeps": epd.sleeps,
+        "asleep": display.awake is None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--epd-types", default=",".join(TIMINGS))
+    parser.add_argument("--presses", type=int, default=6)
+    parser.add_argument("--think", type=float, default=2.0)
+    parser.add_argument("--window", type=float, default=20.0)
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(
+        f"{'panel':<12} {'window':>7} {'first':>7} {'median':>7} "
+        f"{'ready':>7} {'inits':>5} {'sleeps':>6}"
+    )
+    for epd_type in args.epd_types.split(","):
+        for window in (0, args.window):
+            result = run(epd_type, window, args.presses, args.think, args.speed)
+            print(
+                f"{epd_type:<12} {window:5.0f} s "
+                f"{result['to_glass'][0]:5.2f} s "
+                f"{statistics.median(result['to_glass'][1:]):5.2f} s "
+                f"{statistics.median(result['to_ready'][1:]):5.2f} s "
+                f"{result['inits']:5d} {result['sleeps']:6d}"
+                + ("" if result["asleep"] else "  still awake!")
+            )
+
+
+if __name__ == "__main__":
+    main()
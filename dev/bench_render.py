@@ -0,0 +1,241 @@
+"""Benchmark the frame rendering for all panel sizes, layouts and modes.
+
+The frames are rendered from frozen offline data (dev/sample_data.py), so
+runs can be compared. For every size, orientation, layout and mode the
+median and p95 of build() and get_image(), the peak of the memory
+allocations and the PNG encode time are measured. The results are written
+as JSON with sorted keys, which can be diffed between runs, and a baseline
+can be given to list the frames which became slower.
+
+    python dev/bench_render.py --repeat 10 --output bench.json
+    python dev/bench_render.py --baseline bench.json --layouts all,ohlc
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+# Defers the matplotlib imports like in the daemons
+import ticker_startup  # noqa: E402, F401
+from sample_data import sample_snapshot  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Panel sizes of run_tests.py as width, height
+SIZES = ((122, 250), (176, 264), (128, 296), (480, 280), (480, 800), (800, 480))
+LAYOUTS = (
+    "all",
+    "fiat",
+    "fiatheight",
+    "big_one_row",
+    "one_number",
+    "big_two_rows",
+    "mempool",
+    "ohlc",
+)
+MODES = ("fiat", "height", "satfiat", "moscowtime", "usd")
+DAYS_AGO = 3
+# The fixture data is always the same, including its timestamps
+FIXTURE_TIME = 1.7e9
+FIXTURE_SEED = 1
+
+
+def make_ticker(config, chart_engine=None):
+    """Ticker which renders the offline fixture, by default with the chart
+    engine of config.ini."""
+    import ticker_chart
+    from btcticker.ticker import Ticker
+    from ticker_config import load_daemon_config
+    from ticker_refresh import SnapshotMempool, SnapshotPriceProvider, set_snapshot
+
+    if chart_engine is None:
+        chart_engine = load_daemon_config(config).chart_engine
+    if chart_engine == "native":
+        ticker_chart.install()
+    width, height = SIZES[0]
+    ticker = Ticker(
+        config,
+        width,
+        height,
+        mempool=SnapshotMempool(),
+        price_provider=SnapshotPriceProvider(),
+    )
+    snapshot = sample_snapshot(
+        days=max(DAYS_AGO, 7), seed=FIXTURE_SEED, now=FIXTURE_TIME
+    )
+    set_snapshot(ticker, snapshot)
+    ticker.set_days_ago(DAYS_AGO)
+    return ticker
+
+
+def case_key(width, height, orientation, layout, mode):
+    return f"{width}x{height} o{orientation} {layout} {mode}"
+
+
+def cases(sizes, orientations, layouts, modes):
+    for width, height in sizes:
+        for orientation in orientations:
+            for layout in layouts:
+                for mode in modes:
+                    yield width, height, orientation, layout, mode
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _stats(times):
+    return {
+        "median_ms": _ms(float(np.median(times))),
+        "p95_ms": _ms(float(np.percentile(times, 95))),
+    }
+
+
+def bench_case(ticker, layout, mode, repeat):
+    """Timings of one frame, the first render is a warm up and not counted."""
+    build_times = []
+    image_times = []
+    encode_times = []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        ticker.build(mode=mode, layout=layout, mirror=False)
+        built = time.perf_counter()
+        image = ticker.get_image()
+        done = time.perf_counter()
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        encoded = time.perf_counter()
+        if i:
+            build_times.append(built - start)
+            image_times.append(done - built)
+            encode_times.append(encoded - done)
+
+    tracemalloc.start()
+    ticker.build(mode=mode, layout=layout, mirror=False)
+    ticker.get_image()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "build": _stats(build_times),
+        "get_image": _stats(image_times),
+        "encode_png": _stats(encode_times),
+        "png_bytes": len(buffer.getvalue()),
+        "peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def run(ticker, sizes, orientations, layouts, modes, repeat, on_case=None):
+    results = {}
+    for width, height, orientation, layout, mode in cases(
+        sizes, orientations, layouts, modes
+    ):
+        ticker.change_size(width, height)
+        ticker.orientation = orientation
+        key = case_key(width, height, orientation, layout, mode)
+        try:
+            results[key] = bench_case(ticker, layout, mode, repeat)
+        except Exception as e:
+            results[key] = {"error": f"{type(e).__name__}: {e}"}
+        if on_case is not None:
+            on_case(key, results[key])
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """Frames whose median build() time grew by more than threshold."""
+    slower = []
+    for key, result in results.items():
+        old = baseline.get("cases", {}).get(key)
+        if not old or "error" in old or "error" in result:
+            continue
+        before = old["build"]["median_ms"]
+        after = result["build"]["median_ms"]
+        if before > 0 and after > before * (1 + threshold):
+            slower.append((key, before, after))
+    return slower
+
+
+def _list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main():
+    from btcticker.config import Config
+    from ticker_config import load_daemon_config
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default=os.path.join(ROOT, "home.admin/config.ini"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", help="e.g. 176x264,480x800")
+    parser.add_argument("--orientations", default="0")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS))
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--chart-engine", choices=("matplotlib", "native"))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sizes = SIZES
+    if args.sizes:
+        sizes = [tuple(int(v) for v in size.split("x")) for size in _list(args.sizes)]
+    config = Config(path=args.config)
+    chart_engine = args.chart_engine or load_daemon_config(config).chart_engine
+    ticker = make_ticker(config, chart_engine)
+
+    def on_case(key, result):
+        if "error" in result:
+            print(f"{key:<40} {result['error']}")
+        else:
+            print(
+                f"{key:<40} build {result['build']['median_ms']:7.1f} ms "
+                f"p95 {result['build']['p95_ms']:7.1f} ms "
+                f"png {result['encode_png']['median_ms']:6.1f} ms "
+                f"peak {result['peak_alloc_kb']:8.0f} kB"
+            )
+
+    results = run(
+        ticker,
+        sizes,
+        [int(v) for v in _list(args.orientations)],
+        _list(args.layouts),
+        _list(args.modes),
+        args.repeat,
+        on_case,
+    )
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "chart_engine": chart_engine,
+            "repeat": args.repeat,
+            "fixture": {"seed": FIXTURE_SEED, "time": FIXTURE_TIME},
+        },
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(results, baseline, args.threshold)
+        for key, before, after in slower:
+            print(f"slower: {key} {before:.1f} ms -> {after:.1f} ms")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
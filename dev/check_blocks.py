@@ -0,0 +1,112 @@
+"""Run the block subscriber against a local stand-in of the mempool websocket.
+
+The server answers the "want blocks" subscription like mempool.space and
+announces a new block every --interval seconds. The delay between sending a
+block and the on_height callback is printed. In the middle of the run the
+server is restarted to check the reconnect.
+
+    python dev/check_blocks.py --blocks 6 --interval 0.5
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+from websockets.sync.server import serve
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+from ticker_blocks import BlockTipSubscriber  # noqa: E402
+
+
+class StandInServer:
+    def __init__(self, height=900000):
+        self.height = height
+        self.sent = {}
+        self.clients = set()
+        self.server = None
+
+    def handler(self, websocket):
+        request = json.loads(websocket.recv())
+        if "blocks" not in request.get("data", ()):
+            return
+        websocket.send(json.dumps({"blocks": [{"height": self.height}]}))
+        self.clients.add(websocket)
+        try:
+            for message in websocket:
+                if json.loads(message).get("action") == "ping":
+                    websocket.send(json.dumps({"pong": True}))
+        finally:
+            self.clients.discard(websocket)
+
+    def start(self, port=0):
+        self.server = serve(self.handler, "127.0.0.1", port)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.socket.getsockname()[1]
+
+    def stop(self):
+        self.server.shutdown()
+        for websocket in list(self.clients):
+            websocket.close()
+
+    def new_block(self):
+        self.height += 1
+        self.sent[self.height] = time.perf_counter()
+        for websocket in list(self.clients):
+            websocket.send(json.dumps({"block": {"height": self.height}}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=6)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    server = StandInServer()
+    port = server.start()
+    delays = {}
+
+    def on_height(height):
+        if height in server.sent:
+            delays[height] = time.perf_counter() - server.sent[height]
+
+    subscriber = BlockTipSubscriber(
+        f"http://127.0.0.1:{port}/api/",
+        on_height=on_height,
+        poll_interval=0.5,
+        reconnect_delay=0.5,
+    )
+    subscriber.start()
+    time.sleep(0.5)
+    for i in range(args.blocks):
+        if i == args.blocks // 2:
+            print("restarting the server")
+            server.stop()
+            time.sleep(args.interval)
+            server.start(port)
+            time.sleep(2)
+        server.new_block()
+        time.sleep(args.interval)
+    subscriber.stop()
+    server.stop()
+
+    for height in server.sent:
+        delay = delays.get(height)
+        result = "missed" if delay is None else f"{delay * 1000:.2f} ms"
+        print(f"block {height}: {result}")
+    if delays:
+        print(f"median delay {statistics.median(delays.values()) * 1000:.2f} ms")
+    sys.exit(0 if len(delays) == len(server.sent) else 1)
+
+
+if __name__ == "__main__":
+    main()
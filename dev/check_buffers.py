@@ -0,0 +1,266 @@
+"""Check the numpy buffer packers against the waveshare reference code.
+
+The reference functions are copies of the pixel loops of the waveshare_epd
+drivers (getbuffer, getbuffer_4Gray and the color panel converters), of
+the three color panels both the black and the red plane. Every packer has
+to produce the same bytes for random images in both orientations, with
+the dither_first flag of the driver the reference was copied from. The
+time of both implementations is printed as well.
+
+    python dev/check_buffers.py
+"""
+
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+from ticker_buffer import (  # noqa: E402
+    PALETTE_4COLOR,
+    PALETTE_7COLOR,
+    pack_1bit,
+    pack_4color,
+    pack_4gray,
+    pack_7color,
+    pack_bwr,
+)
+
+
+def _reference_orient(image, width, height):
+    if image.size == (width, height):
+        return image
+    return image.rotate(90, expand=True)
+
+
+def reference_getbuffer(image, width, height):
+    """epd2in13_V3.getbuffer(), which rotates before it converts."""
+    image = _reference_orient(image, width, height).convert("1")
+    return bytearray(image.tobytes("raw"))
+
+
+def reference_getbuffer_loop(image, width, height):
+    """epd2in7.getbuffer(), which converts before it rotates."""
+    buf = [0xFF] * (int(width / 8) * height)
+    image_monocolor = image.convert("1")
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    if imwidth == width and imheight == height:
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0:
+                    buf[int((x + y * width) / 8)] &= ~(0x80 >> (x % 8))
+    else:
+        for y in range(imheight):
+            for x in range(imwidth):
+                newx = y
+                newy = height - x - 1
+                if pixels[x, y] == 0:
+                    buf[int((newx + newy * width) / 8)] &= ~(0x80 >> (y % 8))
+    return bytearray(value & 0xFF for value in buf)
+
+
+def reference_getbuffer_4Gray(image, width, height):
+    """epd2in7.getbuffer_4Gray()"""
+    buf = [0xFF] * (int(width / 4) * height)
+    image_monocolor = image.convert("L")
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    i = 0
+    if imwidth == width and imheight == height:
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0xC0:
+                    pixels[x, y] = 0x80
+                elif pixels[x, y] == 0x80:
+                    pixels[x, y] = 0x40
+                i = i + 1
+                if i % 4 == 0:
+                    buf[int((x + (y * width)) / 4)] = (
+                        (pixels[x - 3, y] & 0xC0)
+                        | (pixels[x - 2, y] & 0xC0) >> 2
+                        | (pixels[x - 1, y] & 0xC0) >> 4
+                        | (pixels[x, y] & 0xC0) >> 6
+                    )
+    else:
+        for x in range(imwidth):
+            for y in range(imheight):
+                newx = y
+                newy = height - x - 1
+                if pixels[x, y] == 0xC0:
+                    pixels[x, y] = 0x80
+                elif pixels[x, y] == 0x80:
+                    pixels[x, y] = 0x40
+                i = i + 1
+                if i % 4 == 0:
+                    buf[int((newx + (newy * width)) / 4)] = (
+                        (pixels[x, y - 3] & 0xC0)
+                        | (pixels[x, y - 2] & 0xC0) >> 2
+                        | (pixels[x, y - 1] & 0xC0) >> 4
+                        | (pixels[x, y] & 0xC0) >> 6
+                    )
+    return bytearray(buf)
+
+
+def _reference_bwr_images(image):
+    """The black and the red image of display(), the red image has the red,
+    orange and yellow pixels of image."""
+    rgb = image.convert("RGB")
+    black = rgb.convert("1")
+    red = Image.new("1", rgb.size, 255)
+    colors = rgb.load()
+    black_pixels = black.load()
+    red_pixels = red.load()
+    for y in range(rgb.height):
+        for x in range(rgb.width):
+            r, g, b = colors[x, y]
+            if r >= 128 and b < 128 and r - b >= 64:
+                black_pixels[x, y] = 255
+                red_pixels[x, y] = 0
+    return black, red
+
+
+def reference_getbuffer_bwr(image, width, height):
+    """epd2in13bc.getbuffer() of the black and the red image."""
+    black, red = _reference_bwr_images(image)
+    return (
+        reference_getbuffer_loop(black, width, height),
+        reference_getbuffer_loop(red, width, height),
+    )
+
+
+def reference_getbuffer_bwr_rotated(image, width, height):
+    """epd2in13b_V4.getbuffer() of the black and the red image, which
+    rotates before it converts."""
+    black, red = _reference_bwr_images(_reference_orient(image, width, height))
+    return (
+        reference_getbuffer(black, width, height),
+        reference_getbuffer(red, width, height),
+    )
+
+
+def _reference_quantize(image, width, height, palette):
+    pal_image = Image.new("P", (1, 1))
+    colors = [value for color in palette for value in color]
+    pal_image.putpalette(tuple(colors) + (0, 0, 0) * (256 - len(palette)))
+    image_temp = _reference_orient(image, width, height)
+    return bytearray(image_temp.convert("RGB").quantize(palette=pal_image).tobytes())
+
+
+def reference_getbuffer_7color(image, width, height):
+    """epd5in65f.getbuffer()"""
+    buf_7color = _reference_quantize(image, width, height, PALETTE_7COLOR)
+    buf = [0x00] * int(width * height / 2)
+    idx = 0
+    for i in range(0, len(buf_7color), 2):
+        buf[idx] = (buf_7color[i] << 4) + buf_7color[i + 1]
+        idx += 1
+    return bytearray(buf)
+
+
+def reference_getbuffer_4color(image, width, height):
+    """epd1in64g.getbuffer()"""
+    buf_4color = _reference_quantize(image, width, height, PALETTE_4COLOR)
+    buf = [0x00] * int(width * height / 4)
+    idx = 0
+    for i in range(0, len(buf_4color), 4):
+        buf[idx] = (
+            (buf_4color[i] << 6)
+            + (buf_4color[i + 1] << 4)
+            + (buf_4color[i + 2] << 2)
+            + buf_4color[i + 3]
+        )
+        idx += 1
+    return bytearray(buf)
+
+
+# Black, white, red, orange, yellow, green and blue
+BWR_COLORS = np.array(
+    [
+        (0, 0, 0),
+        (255, 255, 255),
+        (255, 0, 0),
+        (255, 128, 0),
+        (255, 255, 0),
+        (0, 255, 0),
+        (0, 0, 255),
+    ],
+    dtype=np.uint8,
+)
+
+
+def random_image(rng, size, mode):
+    if mode == "bw":
+        values = rng.choice(np.array([0, 255], dtype=np.uint8), size[::-1])
+        return Image.fromarray(values, "L").convert("RGB")
+    if mode == "gray":
+        values = rng.choice(np.array([0, 0x80, 0xC0, 255], dtype=np.uint8), size[::-1])
+        return Image.fromarray(values, "L")
+    if mode == "bwr":
+        values = BWR_COLORS[rng.integers(0, len(BWR_COLORS), size[::-1])]
+        return Image.fromarray(values, "RGB")
+    values = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    return Image.fromarray(values, "RGB")
+
+
+# Packers of the panels whose driver rotates before it converts
+pack_1bit_rotated = partial(pack_1bit, dither_first=False)
+pack_bwr_rotated = partial(pack_bwr, dither_first=False)
+
+# (packer, reference, panel sizes, image kind)
+CHECKS = [
+    (pack_1bit_rotated, reference_getbuffer, [(122, 250), (800, 480)], "rgb"),
+    (pack_1bit, reference_getbuffer_loop, [(176, 264), (128, 296)], "bw"),
+    (pack_1bit, reference_getbuffer_loop, [(176, 264), (128, 296)], "rgb"),
+    (pack_4gray, reference_getbuffer_4Gray, [(176, 264), (280, 480)], "gray"),
+    (pack_bwr, reference_getbuffer_bwr, [(104, 212), (400, 300)], "bwr"),
+    (pack_bwr, reference_getbuffer_bwr, [(104, 212)], "rgb"),
+    (pack_bwr_rotated, reference_getbuffer_bwr_rotated, [(122, 250)], "rgb"),
+    (pack_7color, reference_getbuffer_7color, [(600, 448)], "rgb"),
+    (pack_4color, reference_getbuffer_4color, [(168, 168)], "rgb"),
+]
+
+
+def _bytes(buffer):
+    """The bytes of a buffer or of a tuple of the black and red buffers."""
+    if isinstance(buffer, tuple):
+        return b"".join(buffer)
+    return bytes(buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    failed = 0
+    for packer, reference, sizes, kind in CHECKS:
+        for width, height in sizes:
+            for size in ((width, height), (height, width)):
+                image = random_image(rng, size, kind)
+                start = time.perf_counter()
+                expected = reference(image.copy(), width, height)
+                reference_time = time.perf_counter() - start
+                start = time.perf_counter()
+                result = packer(image, width, height)
+                packer_time = time.perf_counter() - start
+                ok = _bytes(result) == _bytes(expected)
+                failed += not ok
+                print(
+                    f"{'ok  ' if ok else 'FAIL'} {reference.__name__:31} "
+                    f"{width}x{height} image {size[0]}x{size[1]}: "
+                    f"{reference_time * 1000:8.1f} ms -> {packer_time * 1000:6.1f} ms"
+                )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare the frame render time and memory of the matplotlib and native charts.
+
+Every engine runs in its own process, which renders the chart layouts for
+the display sizes of create_sample_images.py from offline sample data. The
+median build() time per frame and the peak RSS of the process are printed.
+
+    python dev/compare_charts.py --repeat 20 --save /tmp/charts
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+# Defers the matplotlib imports like in the daemons
+import ticker_startup  # noqa: E402, F401
+from sample_data import sample_snapshot  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ENGINES = ("matplotlib", "native")
+# Display sizes of create_sample_images.py as width, height
+SIZES = ((250, 122), (264, 176), (296, 128), (480, 280), (800, 480), (480, 800))
+LAYOUTS = ("all", "fiat", "ohlc")
+
+
+def use_dataframes():
+    """mplfinance needs a DataFrame, but btcticker passes the OHLC rows."""
+    import pandas as pd
+    from btcticker.render import image_renderer
+
+    make_candle = image_renderer.makeCandle
+
+    def makeCandle(ohlc, *args, **kwargs):
+        frame = pd.DataFrame(list(ohlc)).set_index("Timestamp")
+        return make_candle(frame, *args, **kwargs)
+
+    image_renderer.makeCandle = makeCandle
+
+
+def run_engine(engine, config_path, repeat, save):
+    import ticker_chart
+    from btcticker.config import Config
+    from btcticker.ticker import Ticker
+    from ticker_refresh import SnapshotMempool, SnapshotPriceProvider, set_snapshot
+
+    if engine == "native":
+        ticker_chart.install()
+    else:
+        use_dataframes()
+    config = Config(path=config_path)
+    snapshot = sample_snapshot(days=7, now=1.7e9)
+    results = {}
+    for width, height in SIZES:
+        ticker = Ticker(
+            config,
+            width,
+            height,
+            mempool=SnapshotMempool(),
+            price_provider=SnapshotPriceProvider(),
+        )
+        set_snapshot(ticker, snapshot)
+        ticker.set_days_ago(1)
+        for layout in LAYOUTS:
+            times = []
+            # The first frame includes the imports and is not counted
+            for _ in range(repeat + 1):
+                start = time.perf_counter()
+                ticker.build(mode="fiat", layout=layout, mirror=False)
+                image = ticker.get_image()
+                times.append(time.perf_counter() - start)
+            results[f"{width}x{height} {layout}"] = statistics.median(times[1:])
+            if save:
+                os.makedirs(save, exist_ok=True)
+                image.save(
+                    os.path.join(save, f"{width}_{height}_{layout}_{engine}.png")
+                )
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"times": results, "peak_rss_kb": peak_rss}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default=os.path.join(ROOT, "home.admin/config.ini"))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--save", help="directory for the rendered frames")
+    parser.add_argument("--engine", choices=ENGINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        result = run_engine(args.engine, args.config, args.repeat, args.save)
+        print(json.dumps(result))
+        return
+
+    results = {}
+    for engine in ENGINES:
+        command = [sys.executable, __file__, "--engine", engine]
+        command += ["--config", args.config, "--repeat", str(args.repeat)]
+        if args.save:
+            command += ["--save", args.save]
+        output = subprocess.run(command, check=True, capture_output=True, text=True)
+        results[engine] = json.loads(output.stdout.splitlines()[-1])
+
+    print(f"{'frame':<18} {'matplotlib':>11} {'native':>9} {'speedup':>8}")
+    for key, slow in results["matplotlib"]["times"].items():
+        fast = results["native"]["times"][key]
+        print(
+            f"{key:<18} {slow * 1000:8.1f} ms {fast * 1000:6.1f} ms {slow / fast:7.1f}x"
+        )
+    print(
+        "peak RSS            "
+        f"{results['matplotlib']['peak_rss_kb'] / 1024:5.0f} MB "
+        f"{results['native']['peak_rss_kb'] / 1024:5.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Offline data for the dev scripts, which render frames without network.
+
+sample_snapshot() returns a DataSnapshot with a mempool state and a random
+walk of candles, which is the same for the same seed.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "home.admin")
+)
+
+from btcticker.domain import PriceSnapshot  # noqa: E402
+from ticker_history import (  # noqa: E402
+    CLOSE,
+    history_limit,
+    interval_seconds,
+    price_change,
+)
+from ticker_refresh import DataSnapshot  # noqa: E402
+
+HEIGHT = 900000
+
+
+def sample_mempool(now, height=HEIGHT):
+    return {
+        "height": height,
+        "count": 23456,
+        "vsize": 12345678,
+        "minFee": [1, 1, 2, 2, 3, 4, 5],
+        "maxFee": [3, 4, 5, 6, 8, 10, 25],
+        "medianFee": [2, 2, 3, 4, 5, 7, 12],
+        "bestFees": {"fastestFee": 12, "halfHourFee": 7, "hourFee": 4},
+        "blocks": [],
+        "last_block": {"timestamp": now - 300, "height": height},
+        "retarget_block": {"timestamp": now - 86400 * 5, "height": height - 864},
+        "last_retarget": height - 864,
+        "minutes_between_blocks": 9.8,
+        "tip_hash": "00" * 32,
+    }
+
+
+def sample_candles(count, interval="1h", start_price=60000.0, seed=1, now=None):
+    """Read-only candles of a random walk, ending at now."""
+    rng = np.random.default_rng(seed)
+    step = interval_seconds(interval) * 1000
+    end = int((time.time() if now is None else now) * 1000) // step * step
+    closes = start_price * np.exp(np.cumsum(rng.normal(0, 0.004, count)))
+    opens = np.concatenate(([start_price], closes[:-1]))
+    spread = np.abs(rng.normal(0, 0.002, (2, count))) * closes
+    candles = np.column_stack(
+        (
+            end - step * np.arange(count - 1, -1, -1),
+            opens,
+            np.maximum(opens, closes) + spread[0],
+            np.minimum(opens, closes) - spread[1],
+            closes,
+            rng.uniform(1, 20, count),
+        )
+    )
+    candles.flags.writeable = False
+    return candles
+
+
+def sample_snapshot(days=7, interval="1h", seed=1, version=1, now=None):
+    now = time.time() if now is None else now
+    candles = sample_candles(
+        history_limit(days, interval), interval, seed=seed, now=now
+    )
+    fiat_price = float(candles[-1, CLOSE])
+    return DataSnapshot(
+        version=version,
+        timestamp=now,
+        mempool=sample_mempool(now),
+        price=PriceSnapshot(
+            "eur",
+            fiat_price,
+            fiat_price * 1.08,
+            1e8 / fiat_price,
+            1e8 / (fiat_price * 1.08),
+        ),
+        price_now=f"{fiat_price:,.0f}",
+        price_change=price_change(candles[:, CLOSE]),
+        days_ago=days,
+        interval=interval,
+        candles=candles,
+    )
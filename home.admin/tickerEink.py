@@ -8,20 +8,34 @@ import os
 import signal
 import socket
 import sys
-import tempfile
 import time
 
+# Defers the chart imports, so it has to be imported before btcticker
+import ticker_startup  # isort: split
+
 import RPi.GPIO as GPIO
 import sdnotify
-from PIL import Image
 
 from btcticker.config import Config
 from btcticker.ticker import Ticker
 
-from ticker_epd import get_epd
-
-temp_dir = tempfile.TemporaryDirectory()
-os.environ["MPLCONFIGDIR"] = temp_dir.name
+import ticker_chart
+from ticker_archive import install_archive
+from ticker_blocks import BlockTipSubscriber
+from ticker_cache import FrameCache, PreRenderer
+from ticker_config import load_daemon_config
+from ticker_display import DisplayWriter, EinkDisplay
+from ticker_epd import get_panel
+from ticker_http import SharedSession
+from ticker_input import ButtonInput
+from ticker_link import LinkHealth
+from ticker_refresh import (
+    RefreshWorker,
+    SnapshotMempool,
+    SnapshotPriceProvider,
+    set_snapshot,
+)
+from ticker_store import load_cached_snapshot, save_snapshot
 
 shutting_down = False
 
@@ -30,6 +44,19 @@ BUTTON_GPIO_2 = 6
 BUTTON_GPIO_3 = 13
 BUTTON_GPIO_4 = 19
 
+# The main loop wakes up at least this often to feed the systemd watchdog
+MAX_IDLE_TIME = 30
+# The missing internet connection is reported after this many seconds
+OFFLINE_MESSAGE_TIME = 3600
+
+buttons = ButtonInput(
+    GPIO, (BUTTON_GPIO_1, BUTTON_GPIO_2, BUTTON_GPIO_3, BUTTON_GPIO_4)
+)
+# The e-paper displays, which remember the last drawn frame
+displays = {}
+# The threads which write the frames to the displays
+writers = {}
+
 
 def internet():
     conn = httplib.HTTPConnection("www.google.com", timeout=10)
@@ -58,52 +85,58 @@ def get_ip():
     return IP
 
 
-def checkInternetSocket(host="8.8.8.8", port=53, timeout=10):
-    try:
-        socket.setdefaulttimeout(timeout)
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
-        return True
-    except OSError as ex:
-        print(ex)
-        return False
-
-
 def get_display_size(epd_type):
-    epd, mirror, width_first, Use4Gray, Init4Gray, FullUpdate = get_epd(epd_type)
-    if width_first:
-        return epd.width, epd.height, mirror
+    panel = get_panel(epd_type)
+    mirror = False
+    if panel.width_first:
+        return panel.width, panel.height, mirror
     else:
-        return epd.height, epd.width, mirror
+        return panel.height, panel.width, mirror
+
+
+def get_display(epd_type):
+    if epd_type not in displays:
+        displays[epd_type] = EinkDisplay(epd_type)
+    return displays[epd_type]
 
 
-def draw_image(epd_type, image=None):
+def draw_image(epd_type, image=None, keep_awake=False):
     #   A visual cue that the wheels have fallen off
-    epd, mirror, width_first, Use4Gray, Init4Gray, FullUpdate = get_epd(epd_type)
     GPIO.setmode(GPIO.BCM)
-    if Init4Gray:
-        epd.Init_4Gray()
-    elif Use4Gray:
-        epd.init(0)
-    elif FullUpdate:
-        epd.init(epd.FULL_UPDATE)
-    else:
-        epd.init()
-    if image is None:
-        image = Image.new("L", (epd.height, epd.width), 255)
-    logging.info("draw")
-    if Use4Gray:
-        epd.display_4Gray(epd.getbuffer_4Gray(image))
-    else:
-        epd.display(epd.getbuffer(image))
+    get_display(epd_type).draw(image, keep_awake)
+    # The driver releases the GPIOs when the panel goes to sleep
+    if not keep_awake:
+        setup_GPIO()
+
 
-    epd.sleep()
+def sleep_display(epd_type):
+    get_display(epd_type).sleep()
     setup_GPIO()
 
 
+def get_writer(epd_type):
+    if epd_type not in writers:
+        writers[epd_type] = DisplayWriter(
+            lambda image, keep_awake: draw_image(epd_type, image, keep_awake),
+            on_idle=buttons.wakeup,
+            sleep=lambda: sleep_display(epd_type),
+        )
+        writers[epd_type].start()
+    return writers[epd_type]
+
+
+def show_image(epd_type, image=None, on_shown=None, warm=False):
+    """Queue image for the display, it replaces a frame which still waits.
+
+    A warm image keeps the panel awake for the interaction_time.
+    """
+    get_writer(epd_type).submit(image, on_shown, warm)
+
+
 def showmessage(epd_type, ticker, message, mirror, inverted):
     ticker.inverted = inverted
     ticker.build_message(message, mirror=mirror)
-    draw_image(epd_type, ticker.get_image())
+    show_image(epd_type, ticker.get_image())
     return time.time()
 
 
@@ -137,26 +170,40 @@ def signal_handler(sig, frame):
 
 
 def setup_GPIO():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(BUTTON_GPIO_1, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(BUTTON_GPIO_2, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(BUTTON_GPIO_3, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(BUTTON_GPIO_4, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    buttons.setup()
+
+
+def get_idle_time(deadlines):
+    idle_time = min(deadlines) - time.time()
+    return min(MAX_IDLE_TIME, max(0.05, idle_time))
 
 
 def main(config, config_file):  # noqa: C901
     global epd_type
     epd_type = config.main.epd_type
+    daemon_config = load_daemon_config(config)
+    # matplotlib is imported for the first chart, its font cache is kept
+    os.environ["MPLCONFIGDIR"] = os.path.join(daemon_config.cache_dir, "matplotlib")
+    if daemon_config.chart_engine == "native":
+        ticker_chart.install()
+    install_archive(config)
+    get_display(epd_type).partial_refresh = daemon_config.partial_refresh
+    get_writer(epd_type).warm_time = daemon_config.interaction_time
 
     w, h, mirror = get_display_size(epd_type)
+    # The ticker renders the snapshots of the refresh worker
+    snapshot_data = {
+        "mempool": SnapshotMempool(),
+        "price_provider": SnapshotPriceProvider(),
+    }
     if config.main.orientation == 90:
-        ticker = Ticker(config, h, w)
+        ticker = Ticker(config, h, w, **snapshot_data)
     elif config.main.orientation == 270:
-        ticker = Ticker(config, h, w)
+        ticker = Ticker(config, h, w, **snapshot_data)
     else:
-        ticker = Ticker(config, w, h)
+        ticker = Ticker(config, w, h, **snapshot_data)
 
-    height = ticker.mempool.getData()["height"]
+    height = None
     # lifetime of 2.7 panel is 5 years and 1000000 refresh
     if config.main.show_block_height:
         # 5*365*(24*60/3.6 + 144) / 1000000
@@ -166,8 +213,9 @@ def main(config, config_file):  # noqa: C901
         # 5*365*(24*60/3.0) / 1000000
         # Update every 2.8 min
         updatefrequency = 168
-    ticker.set_min_refresh_time(updatefrequency - 1)
     updatefrequency_after_newblock = 120
+    # Data which could not be refreshed for this long is reported on the display
+    max_data_age = 3 * updatefrequency
     # mode_list = ["fiat", "height", "satfiat", "usd", "newblock"]
 
     layout_list = []
@@ -201,19 +249,125 @@ def main(config, config_file):  # noqa: C901
 
     inverted = config.main.inverted
 
-    def fullupdate(mode, days, layout, inverted, refresh=True):
-        try:
+    link = LinkHealth()
+    session = SharedSession()
+    # The last data from before a restart is shown until it is refreshed
+    cache_path = os.path.join(daemon_config.cache_dir, "snapshot.npz")
+    cached_snapshot = load_cached_snapshot(
+        cache_path, config, max(days_list), max_data_age
+    )
+    worker = RefreshWorker(
+        config,
+        updatefrequency - 1,
+        # The longest history is fetched, shorter ones are sliced from it
+        days_ago=max(days_list),
+        link=link,
+        session=session,
+        snapshot=cached_snapshot,
+        store=lambda snapshot: save_snapshot(cache_path, snapshot),
+        refresh_budget=daemon_config.refresh_budget,
+        on_publish=lambda snapshot: buttons.wakeup(),
+    )
+    worker.start()
+    if config.main.show_block_height:
+        blocks = BlockTipSubscriber(
+            config.main.mempool_api_url,
+            on_height=worker.notify_height,
+            session=session,
+        )
+        blocks.start()
+
+    frame_cache = FrameCache(daemon_config.frame_cache_size * 1024 * 1024)
+    prerenderer = None
+    if daemon_config.prerender:
+        # Half of the cache is kept for the frames which were actually shown
+        prerenderer = PreRenderer(frame_cache, frame_cache.max_bytes // 2)
+
+    def frame_key(mode, days, layout, inverted, snapshot):
+        size = (ticker.width, ticker.height)
+        return (mode, layout, days, inverted, size, snapshot.version)
+
+    def render(mode, days, layout, inverted, snapshot):
+        key = frame_key(mode, days, layout, inverted, snapshot)
+        # Frames of older data are never shown again
+        frame_cache.retain(lambda cached: cached[-1] == snapshot.version)
+        image = frame_cache.get(key)
+        if image is None:
+            set_snapshot(ticker, snapshot)
             ticker.set_days_ago(days)
-            if refresh:
-                ticker.refresh()
             ticker.inverted = inverted
             ticker.build(mode=mode, layout=layout, mirror=mirror)
-            draw_image(epd_type, ticker.get_image())
+            image = ticker.get_image()
+            frame_cache.put(key, image)
+        return image
+
+    def next_views(snapshot):
+        # The next periodic update, followed by the views of the keys 1 to 4
+        mode = mode_list[last_mode_ind]
+        days = days_list[days_ind]
+        layout = layout_list[last_layout_ind]
+        return [
+            (view + (snapshot,))
+            for view in (
+                (mode, days, layout, inverted),
+                (
+                    mode_list[(last_mode_ind + 1) % len(mode_list)],
+                    days,
+                    layout,
+                    inverted,
+                ),
+                (mode, days_list[(days_ind + 1) % len(days_list)], layout, inverted),
+                (
+                    mode,
+                    days,
+                    layout_list[(last_layout_ind + 1) % len(layout_list)],
+                    inverted,
+                ),
+                (mode, days, layout, not inverted),
+            )
+        ]
+
+    # A message or the cached data are replaced as soon as new data arrives
+    shown_version = None
+    provisional = False
+
+    def fullupdate(mode, days, layout, inverted, warm=False):
+        nonlocal shown_version, provisional
+        snapshot = worker.get_snapshot()
+        if snapshot is None and worker.last_error is None:
+            # Nothing to show before the first refresh has finished
+            return lastcoinfetch
+        if snapshot is None or (
+            worker.last_error is not None and snapshot.age() > max_data_age
+        ):
+            message = str(worker.last_error)
+            if link.offline_time() > OFFLINE_MESSAGE_TIME:
+                message = (
+                    "Internet is not available!\n"
+                    f"Check your wpa_supplicant.conf\nIp:{get_ip()}"
+                )
+            if snapshot is not None:
+                message += f"\nData is {snapshot.age() / 60:.0f} min old"
+            logging.warning(message)
+            showmessage(epd_type, ticker, message, mirror, inverted)
+            shown_version = None
+            provisional = True
+            return time.time()
+        logging.info(f"Data age {snapshot.age():.0f} s")
+        try:
+            show_image(
+                epd_type,
+                render(mode, days, layout, inverted, snapshot),
+                on_shown=ticker_startup.first_frame_shown,
+                warm=warm,
+            )
+            shown_version = snapshot.version
+            provisional = snapshot is cached_snapshot
+            logging.info(frame_cache.stats())
             lastgrab = time.time()
         except Exception as e:
             logging.warning(e)
             showmessage(epd_type, ticker, e, mirror, inverted)
-            time.sleep(10)
             lastgrab = lastcoinfetch
         return lastgrab
 
@@ -234,49 +388,57 @@ def main(config, config_file):  # noqa: C901
         newblock_displayed = False
         #       Time of start
         lastcoinfetch = time.time()
-        lastheightfetch = time.time()
 
         notifier = sdnotify.SystemdNotifier()
         notifier.notify("READY=1")
-        offline_counter = 0
+        idle_time = 0
+        pending_update = False
         while True:
+            key = buttons.get(timeout=idle_time)
+            idle_time = 0
             if shutting_down:
                 logging.info("Ticker is shutting down.....")
                 showmessage(
                     epd_type, ticker, "Ticker is shutting down...", mirror, inverted
                 )
+                writer = get_writer(epd_type)
+                writer.stop()
+                writer.join()
                 break
             display_update = False
             notifier.notify("WATCHDOG=1")
 
-            if GPIO.input(BUTTON_GPIO_1) == GPIO.LOW:
+            if key == BUTTON_GPIO_1:
                 logging.info("Key1 after %.2f s" % (time.time() - lastcoinfetch))
                 last_mode_ind += 1
                 if last_mode_ind >= len(mode_list):
                     last_mode_ind = 0
                 display_update = True
-            elif GPIO.input(BUTTON_GPIO_2) == GPIO.LOW:
+            elif key == BUTTON_GPIO_2:
                 logging.info("Key2 after %.2f s" % (time.time() - lastcoinfetch))
                 days_ind += 1
                 if days_ind >= len(days_list):
                     days_ind = 0
                 display_update = True
-            elif GPIO.input(BUTTON_GPIO_3) == GPIO.LOW:
+            elif key == BUTTON_GPIO_3:
                 logging.info("Key3 after %.2f s" % (time.time() - lastcoinfetch))
                 last_layout_ind += 1
                 if last_layout_ind >= len(layout_list):
                     last_layout_ind = 0
                 display_update = True
-            elif GPIO.input(BUTTON_GPIO_4) == GPIO.LOW:
+            elif key == BUTTON_GPIO_4:
                 logging.info("Key4 after %.2f s" % (time.time() - lastcoinfetch))
                 inverted = not inverted
                 display_update = True
-            if (time.time() - lastheightfetch > 30) and config.main.show_block_height:
-                try:
-                    new_height = ticker.mempool.getData()["height"]
-                except Exception as e:
-                    logging.warning(e)
-                if new_height > height and not display_update:
+            if display_update or pending_update:
+                # Key presses during a write are shown by one frame after it
+                pending_update = get_writer(epd_type).busy
+                display_update = not pending_update
+            snapshot = worker.get_snapshot()
+            data_available = snapshot is not None or worker.last_error is not None
+            if snapshot is not None and config.main.show_block_height:
+                new_height = snapshot.height
+                if height is not None and new_height > height and not display_update:
                     logging.info(
                         "Update newblock after %.2f s" % (time.time() - lastcoinfetch)
                     )
@@ -288,45 +450,31 @@ def main(config, config_file):  # noqa: C901
                     )
                     newblock_displayed = True
                 height = new_height
-                lastheightfetch = time.time()
 
             if mode_list[last_mode_ind] == "newblock" and datapulled:
-                time.sleep(10)
-            elif (
-                (time.time() - lastcoinfetch > updatefrequency) or (datapulled is False)
-            ) and not checkInternetSocket():
-                offline_counter += 1
-                if offline_counter > 360:
-                    local_ip = get_ip()
-                    showmessage(
-                        epd_type,
-                        ticker,
-                        "Internet is not available!\nWill retry in 3 minutes.\n"
-                        f"Check your wpa_supplicant.conf\nIp:{local_ip}",
-                        mirror,
-                        inverted,
-                    )
-                    time.sleep(180)
-                    offline_counter = 0
-                else:
-                    display_update = False
-                    time.sleep(10)
-            elif display_update:
+                idle_time = 10
+            elif display_update and data_available:
+                # The view of the key press is shown with the first data
                 fullupdate(
                     mode_list[last_mode_ind],
                     days_list[days_ind],
                     layout_list[last_layout_ind],
                     inverted,
-                    refresh=False,
+                    warm=True,
                 )
-                offline_counter = 0
-            elif (time.time() - lastcoinfetch > updatefrequency) or (
-                datapulled is False
-            ):
+            elif (
+                (time.time() - lastcoinfetch > updatefrequency)
+                or (datapulled is False)
+                or (
+                    provisional
+                    and worker.last_error is None
+                    and snapshot is not None
+                    and snapshot.version != shown_version
+                )
+            ) and data_available:
                 logging.info(
                     "Update ticker after %.2f s" % (time.time() - lastcoinfetch)
                 )
-                offline_counter = 0
                 lastcoinfetch = fullupdate(
                     mode_list[last_mode_ind],
                     days_list[days_ind],
@@ -353,7 +501,6 @@ def main(config, config_file):  # noqa: C901
                     "Update from newblock display after %.2f s"
                     % (time.time() - lastcoinfetch)
                 )
-                offline_counter = 0
                 lastcoinfetch = fullupdate(
                     mode_list[last_mode_ind],
                     days_list[days_ind],
@@ -363,12 +510,31 @@ def main(config, config_file):  # noqa: C901
                 datapulled = True
                 newblock_displayed = False
             else:
-                time.sleep(0.05)
+                if data_available:
+                    deadlines = [lastcoinfetch + updatefrequency]
+                else:
+                    # The refresh worker wakes up the loop with the first data
+                    deadlines = [time.time() + MAX_IDLE_TIME]
+                if newblock_displayed:
+                    deadlines.append(lastcoinfetch + updatefrequency_after_newblock)
+                idle_time = get_idle_time(deadlines)
+                if (
+                    prerenderer is not None
+                    and snapshot is not None
+                    and prerenderer.step(next_views(snapshot), frame_key, render)
+                ):
+                    # Look for key presses before rendering the next view
+                    idle_time = 0
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="config.ini")
+    parser.add_argument(
+        ticker_startup.PROFILE_OPTION,
+        action="store_true",
+        help="print the import time of every module after the first frame",
+    )
     args = parser.parse_args()
 
     config = Config(path=args.config)
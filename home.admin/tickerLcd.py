@@ -10,6 +10,9 @@ import sys
 import tempfile
 import time
 
+# Defers the chart imports, so it has to be imported before btcticker
+import ticker_startup  # isort: split
+
 import RPi.GPIO as GPIO
 import sdnotify
 from PIL import Image
@@ -17,15 +20,28 @@ from PIL import Image
 from btcticker.config import Config
 from btcticker.ticker import Ticker
 
+import ticker_chart
+from ticker_archive import install_archive
+from ticker_config import load_daemon_config
+from ticker_framebuffer import Framebuffer
+from ticker_input import ButtonInput
+
 shutting_down = False
 temp_dir = tempfile.TemporaryDirectory()
-os.environ["MPLCONFIGDIR"] = temp_dir.name
 
 BUTTON_GPIO_1 = 5
 BUTTON_GPIO_2 = 6
 BUTTON_GPIO_3 = 13
 BUTTON_GPIO_4 = 19
 
+# The main loop wakes up at least this often to feed the systemd watchdog
+MAX_IDLE_TIME = 30
+
+buttons = ButtonInput(
+    GPIO, (BUTTON_GPIO_1, BUTTON_GPIO_2, BUTTON_GPIO_3, BUTTON_GPIO_4)
+)
+framebuffer = None
+
 
 def internet():
     conn = httplib.HTTPConnection("www.google.com", timeout=5)
@@ -44,10 +60,25 @@ def get_display_size(epd_type):
     return 320, 480, False
 
 
+def open_framebuffer(path, rotate=False):
+    if not path:
+        # LCD (/dev/fb1) or HDMI (/dev/fb0), as in ticker.display.sh
+        path = "/dev/fb1" if os.path.exists("/dev/fb1") else "/dev/fb0"
+    try:
+        return Framebuffer(path, rotate=rotate)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Cannot use {path}, falling back to ticker.display.sh: {e}")
+        return None
+
+
 def draw_image(epd_type, image=None):
     #   A visual cue that the wheels have fallen off
     if image is None:
         image = Image.new("L", (480, 320), 255)
+    if framebuffer is not None:
+        rows = framebuffer.draw(image)
+        logging.info(f"draw {rows} rows")
+        return
     image.save(temp_dir.name + "/ticker.png", "PNG")
     os.system(
         "/home/admin/config.scripts/ticker.display.sh image "
@@ -93,16 +124,26 @@ def signal_handler(sig, frame):
 
 
 def setup_GPIO():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(BUTTON_GPIO_1, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(BUTTON_GPIO_2, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(BUTTON_GPIO_3, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(BUTTON_GPIO_4, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    buttons.setup()
+
+
+def get_idle_time(deadlines):
+    idle_time = min(deadlines) - time.time()
+    return min(MAX_IDLE_TIME, max(0.05, idle_time))
 
 
 def main(config, config_file):  # noqa: C901
-    global epd_type
+    global epd_type, framebuffer
     epd_type = config.main.epd_type
+    daemon_config = load_daemon_config(config)
+    # matplotlib is imported for the first chart, its font cache is kept
+    os.environ["MPLCONFIGDIR"] = os.path.join(daemon_config.cache_dir, "matplotlib")
+    if daemon_config.chart_engine == "native":
+        ticker_chart.install()
+    install_archive(config)
+    framebuffer = open_framebuffer(
+        daemon_config.framebuffer, daemon_config.framebuffer_rotate
+    )
 
     w, h, mirror = get_display_size(epd_type)
     if config.main.orientation == 90:
@@ -164,6 +205,7 @@ def main(config, config_file):  # noqa: C901
             ticker.inverted = inverted
             ticker.build(mode=mode, layout=layout, mirror=mirror)
             draw_image(epd_type, ticker.get_image())
+            ticker_startup.first_frame_shown()
             lastgrab = time.time()
         except Exception as e:
             logging.warning(e)
@@ -194,7 +236,10 @@ def main(config, config_file):  # noqa: C901
         notifier = sdnotify.SystemdNotifier()
         notifier.notify("READY=1")
 
+        idle_time = 0
         while True:
+            key = buttons.get(timeout=idle_time)
+            idle_time = 0
             if shutting_down:
                 logging.info("Ticker is shutting down.....")
                 showmessage(
@@ -204,25 +249,25 @@ def main(config, config_file):  # noqa: C901
             display_update = False
             notifier.notify("WATCHDOG=1")
 
-            if GPIO.input(BUTTON_GPIO_1) == GPIO.LOW:
+            if key == BUTTON_GPIO_1:
                 logging.info("Key1 after %.2f s" % (time.time() - lastcoinfetch))
                 last_mode_ind += 1
                 if last_mode_ind >= len(mode_list):
                     last_mode_ind = 0
                 display_update = True
-            elif GPIO.input(BUTTON_GPIO_2) == GPIO.LOW:
+            elif key == BUTTON_GPIO_2:
                 logging.info("Key2 after %.2f s" % (time.time() - lastcoinfetch))
                 days_ind += 1
                 if days_ind >= len(days_list):
                     days_ind = 0
                 display_update = True
-            elif GPIO.input(BUTTON_GPIO_3) == GPIO.LOW:
+            elif key == BUTTON_GPIO_3:
                 logging.info("Key3 after %.2f s" % (time.time() - lastcoinfetch))
                 last_layout_ind += 1
                 if last_layout_ind >= len(layout_list):
                     last_layout_ind = 0
                 display_update = True
-            elif GPIO.input(BUTTON_GPIO_4) == GPIO.LOW:
+            elif key == BUTTON_GPIO_4:
                 logging.info("Key4 after %.2f s" % (time.time() - lastcoinfetch))
                 inverted = not inverted
                 display_update = True
@@ -246,7 +291,7 @@ def main(config, config_file):  # noqa: C901
                 lastheightfetch = time.time()
 
             if mode_list[last_mode_ind] == "newblock" and datapulled:
-                time.sleep(10)
+                idle_time = 10
             elif (
                 (time.time() - lastcoinfetch > updatefrequency) or (datapulled is False)
             ) and not internet():
@@ -304,12 +349,22 @@ def main(config, config_file):  # noqa: C901
                 datapulled = True
                 newblock_displayed = False
             else:
-                time.sleep(0.05)
+                deadlines = [lastcoinfetch + updatefrequency]
+                if config.main.show_block_height:
+                    deadlines.append(lastheightfetch + 30)
+                if newblock_displayed:
+                    deadlines.append(lastcoinfetch + updatefrequency_after_newblock)
+                idle_time = get_idle_time(deadlines)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="config.ini")
+    parser.add_argument(
+        ticker_startup.PROFILE_OPTION,
+        action="store_true",
+        help="print the import time of every module after the first frame",
+    )
     args = parser.parse_args()
 
     config = Config(path=args.config)
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+import argparse
+import logging
+import os
+import signal
+import sys
+
+# Defers the chart imports, so it has to be imported before btcticker
+import ticker_startup  # noqa: F401 # isort: split
+
+from btcticker.config import Config
+
+from ticker_archive import install_archive
+from ticker_blocks import BlockTipSubscriber
+from ticker_config import load_daemon_config
+from ticker_http import SharedSession
+from ticker_link import LinkHealth
+from ticker_refresh import RefreshWorker
+from ticker_server import FrameHTTPServer, FrameServer
+from ticker_store import load_cached_snapshot, save_snapshot
+
+# The data is refreshed this often, independent of the number of displays
+REFRESH_INTERVAL = 120
+
+
+def init_logging(warnlevel=logging.WARNING):
+    logger = logging.getLogger()
+    logger.setLevel(warnlevel)
+    handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(handler)
+
+
+def signal_hook(*args):
+    logging.info("...finally going down")
+    sys.exit(0)
+
+
+def config_list(value, convert=str):
+    return [
+        convert(item.replace('"', "").replace(" ", "")) for item in value.split(",")
+    ]
+
+
+def main(config, config_file):
+    daemon_config = load_daemon_config(config)
+    # matplotlib is imported for the first chart, its font cache is kept
+    os.environ["MPLCONFIGDIR"] = os.path.join(daemon_config.cache_dir, "matplotlib")
+    install_archive(config)
+
+    layout_list = config_list(config.main.layout_list)
+    mode_list = config_list(config.main.mode_list)
+    days_list = config_list(config.main.days_list, int)
+    # Requests can leave out any parameter of the configured view
+    defaults = {
+        "epd_type": config.main.epd_type,
+        "orientation": config.main.orientation,
+        "mode": mode_list[config.main.start_mode_ind],
+        "layout": layout_list[config.main.start_layout_ind],
+        "days": days_list[config.main.start_days_ind],
+        "inverted": config.main.inverted,
+        "format": "png",
+    }
+
+    link = LinkHealth()
+    session = SharedSession()
+    cache_path = os.path.join(daemon_config.cache_dir, "snapshot.npz")
+    cached_snapshot = load_cached_snapshot(
+        cache_path, config, max(days_list), 3 * REFRESH_INTERVAL
+    )
+    worker = RefreshWorker(
+        config,
+        REFRESH_INTERVAL,
+        # The longest history is fetched, shorter ones are sliced from it
+        days_ago=max(days_list),
+        link=link,
+        session=session,
+        snapshot=cached_snapshot,
+        store=lambda snapshot: save_snapshot(cache_path, snapshot),
+        refresh_budget=daemon_config.refresh_budget,
+    )
+    worker.start()
+    if config.main.show_block_height:
+        blocks = BlockTipSubscriber(
+            config.main.mempool_api_url,
+            on_height=worker.notify_height,
+            session=session,
+        )
+        blocks.start()
+
+    frames = FrameServer(
+        worker,
+        config_file,
+        defaults,
+        max(days_list),
+        daemon_config.render_workers,
+        daemon_config.frame_cache_size * 1024 * 1024,
+    )
+    server = FrameHTTPServer(
+        (daemon_config.server_address, daemon_config.server_port), frames
+    )
+    signal.signal(signal.SIGTERM, signal_hook)
+    logging.info(f"Serving frames on port {daemon_config.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        frames.shutdown()
+        worker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the ticker frames of many displays over HTTP"
+    )
+    parser.add_argument("--config", default="config.ini")
+    args = parser.parse_args()
+
+    config = Config(path=args.config)
+    init_logging(config.main.loglevel)
+    try:
+        main(config, args.config)
+    except Exception as e:
+        logging.exception(e)
+        raise
@@ -0,0 +1,194 @@
+import base64
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from ticker_config import load_daemon_config
+
+logger = logging.getLogger(__name__)
+
+# The stored content is already decoded, its length can differ
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def request_key(method, url):
+    """Method and url with sorted query parameters."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method} {urlunsplit(parts._replace(query=query, fragment=''))}"
+
+
+def endpoint_key(method, url):
+    """Method and url without the query, e.g. for a changing since parameter."""
+    parts = urlsplit(url)
+    return f"{method} {urlunsplit(parts._replace(query='', fragment=''))}"
+
+
+class HttpArchive:
+    """Records the HTTP responses of the data providers or replays them.
+
+    All requests sessions are covered, the ones of btcticker, pymempool and
+    ccxt as well as the SharedSession. When recording, every response is
+    appended as a JSON line to a gzip file at path. When replaying, nothing
+    reaches the network: the recorded responses are served after latency
+    seconds plus a random jitter of up to +-jitter seconds. Requests with
+    the same url are answered by their recordings in turn, a request with
+    another query (like a since parameter) by the recordings of its
+    endpoint. Requests which were not recorded fail like an offline
+    connection. The client side rate limit of ccxt is not applied to the
+    replayed requests.
+    """
+
+    def __init__(self, path, replay=False, latency=0.0, jitter=0.0):
+        self.path = path
+        self.replay = replay
+        self.latency = latency
+        self.jitter = jitter
+        self.recorded = 0
+        self.replayed = 0
+        self._responses = defaultdict(list)
+        self._endpoints = defaultdict(list)
+        self._turns = defaultdict(int)
+        self._lock = threading.Lock()
+        self._send = None
+        self._throttle = None
+        if replay:
+            self._load()
+
+    def _load(self):
+        with gzip.open(self.path, "rt") as f:
+            for line in f:
+                entry = json.loads(line)
+                method, url = entry["method"], entry["url"]
+                self._responses[request_key(method, url)].append(entry)
+                self._endpoints[endpoint_key(method, url)].append(entry)
+        logger.info(
+            f"Replaying {sum(map(len, self._responses.values()))} responses "
+            f"from {self.path}"
+        )
+
+    def install(self):
+        """Route the requests of all sessions through the archive."""
+        if self._send is not None:
+            return self
+        send = self._send = HTTPAdapter.send
+        archive = self
+
+        def archive_send(adapter, request, **kwargs):
+            if archive.replay:
+                return archive.replay_response(adapter, request)
+            response = send(adapter, request, **kwargs)
+            archive.record(request, response)
+            return response
+
+        HTTPAdapter.send = archive_send
+        if self.replay:
+            from ccxt.base.exchange import Exchange
+
+            self._throttle = Exchange.throttle
+            Exchange.throttle = lambda exchange, cost=None: None
+        return self
+
+    def uninstall(self):
+        if self._send is not None:
+            HTTPAdapter.send = self._send
+            self._send = None
+        if self._throttle is not None:
+            from ccxt.base.exchange import Exchange
+
+            Exchange.throttle = self._throttle
+            self._throttle = None
+
+    def record(self, request, response):
+        content = response.content
+        try:
+            body = {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            body = {"base64": base64.b64encode(content).decode("ascii")}
+        entry = {
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in DROPPED_HEADERS
+            },
+            **body,
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            # Every line is a gzip member of its own, gzip reads them as one
+            with gzip.open(self.path, "at") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def _next_entry(self, request):
+        with self._lock:
+            key = request_key(request.method, request.url)
+            entries = self._responses.get(key)
+            if not entries:
+                key = endpoint_key(request.method, request.url)
+                entries = self._endpoints.get(key)
+            if not entries:
+                return None
+            entry = entries[self._turns[key] % len(entries)]
+            self._turns[key] += 1
+            self.replayed += 1
+            return entry
+
+    def replay_response(self, adapter, request):
+        entry = self._next_entry(request)
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if entry is None:
+            raise requests.ConnectionError(
+                f"No recorded response for {request.method} {request.url}",
+                request=request,
+            )
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        if "base64" in entry:
+            response._content = base64.b64decode(entry["base64"])
+        else:
+            response._content = entry["text"].encode("utf-8")
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+
+def install_archive(config):
+    """Record or replay the HTTP responses as set in the [Main] section.
+
+    Returns the installed HttpArchive or None, when record_to and
+    replay_from are not set.
+    """
+    daemon_config = load_daemon_config(config)
+    if daemon_config.replay_from:
+        archive = HttpArchive(
+            daemon_config.replay_from,
+            replay=True,
+            latency=daemon_config.replay_latency,
+            jitter=daemon_config.replay_jitter,
+        )
+    elif daemon_config.record_to:
+        archive = HttpArchive(daemon_config.record_to)
+        logger.info(f"Recording the responses to {daemon_config.record_to}")
+    else:
+        return None
+    return archive.install()
@@ -0,0 +1,126 @@
+import json
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+from pymempool import MempoolAPI
+from websockets.sync.client import connect
+
+from ticker_endpoints import split_api_url
+from ticker_link import LinkHealth
+
+logger = logging.getLogger(__name__)
+
+
+def websocket_url(api_url):
+    """Return the websocket url of a mempool api url.
+
+    https://mempool.space/api/ becomes wss://mempool.space/api/v1/ws
+    """
+    parts = urlsplit(api_url.strip())
+    scheme = "wss" if parts.scheme == "https" else "ws"
+    path = parts.path.rstrip("/") + "/v1/ws"
+    return urlunsplit((scheme, parts.netloc, path, "", ""))
+
+
+class BlockTipSubscriber(threading.Thread):
+    """Reports new blocks from the mempool websocket api.
+
+    Subscribes to the blocks of the first reachable url of api_url (a comma
+    separated list like mempool_api_url) and calls on_height with every new
+    block height. While no websocket is connected, the tip height is polled
+    every poll_interval seconds and the subscription is retried with an
+    exponential backoff. The polling uses the SharedSession session, when
+    it is given.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        on_height=None,
+        poll_interval=30,
+        reconnect_delay=5,
+        max_reconnect_delay=300,
+        ping_interval=30,
+        session=None,
+    ):
+        super().__init__(name="blocks", daemon=True)
+        self.api_urls = split_api_url(api_url)
+        self.on_height = on_height
+        self.poll_interval = poll_interval
+        self.ping_interval = ping_interval
+        self.session = session
+        self.height = None
+        self._reconnect = LinkHealth(reconnect_delay, max_reconnect_delay)
+        self._url_index = 0
+        self._api = None
+        self._websocket = None
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        websocket = self._websocket
+        if websocket is not None:
+            websocket.close()
+
+    def run(self):
+        while not self._stopped.is_set():
+            api_url = self.api_urls[self._url_index % len(self.api_urls)]
+            try:
+                self._listen(websocket_url(api_url))
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                logger.info(f"Block subscription at {api_url} failed: {e}")
+                self._reconnect.record_failure(e)
+                self._url_index += 1
+            finally:
+                self._websocket = None
+            self._poll_until(self._reconnect.backoff())
+
+    def _listen(self, url):
+        with connect(url, open_timeout=10, close_timeout=1) as websocket:
+            self._websocket = websocket
+            if self._stopped.is_set():
+                return
+            websocket.send(json.dumps({"action": "want", "data": ["blocks"]}))
+            logger.info(f"Subscribed to new blocks at {url}")
+            self._reconnect.record_success()
+            while not self._stopped.is_set():
+                try:
+                    message = websocket.recv(timeout=self.ping_interval)
+                except TimeoutError:
+                    websocket.send(json.dumps({"action": "ping"}))
+                    continue
+                self._handle(json.loads(message))
+
+    def _handle(self, data):
+        heights = [block["height"] for block in data.get("blocks", ())]
+        if "block" in data:
+            heights.append(data["block"]["height"])
+        if heights:
+            self._set_height(max(heights))
+
+    def _poll_until(self, delay):
+        """Poll the tip height until delay seconds have passed."""
+        remaining = delay
+        while remaining > 0 and not self._stopped.is_set():
+            try:
+                if self._api is None:
+                    self._api = MempoolAPI(api_base_url=",".join(self.api_urls))
+                    if self.session is not None:
+                        self.session.install_mempool(self._api)
+                self._set_height(int(self._api.get_block_tip_height()))
+            except Exception as e:
+                logger.info(f"Polling the block height failed: {e}")
+            wait = min(self.poll_interval, remaining)
+            self._stopped.wait(wait)
+            remaining -= wait
+
+    def _set_height(self, height):
+        if self.height is not None and height <= self.height:
+            return
+        self.height = height
+        logger.info(f"Block height {height}")
+        if self.on_height is not None:
+            self.on_height(height)
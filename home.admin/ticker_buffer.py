@@ -0,0 +1,127 @@
+import numpy as np
+from PIL import Image
+
+# Palettes of the color panels, the index is the color code of the panel
+PALETTE_7COLOR = (
+    (0, 0, 0),
+    (255, 255, 255),
+    (0, 255, 0),
+    (0, 0, 255),
+    (255, 0, 0),
+    (255, 255, 0),
+    (255, 128, 0),
+)
+PALETTE_4COLOR = ((0, 0, 0), (255, 255, 255), (255, 255, 0), (255, 0, 0))
+
+
+def orient(image, width, height, mirror=False):
+    """Return image in the native orientation of a width x height panel.
+
+    Images with swapped dimensions are rotated by 90 degrees, as the
+    waveshare drivers do in getbuffer().
+    """
+    if mirror:
+        image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    if image.size == (width, height):
+        return image
+    if image.size == (height, width):
+        return image.transpose(Image.Transpose.ROTATE_90)
+    raise ValueError(
+        f"Image size {image.size} does not fit the display size {width}x{height}"
+    )
+
+
+def _pack(codes, bits):
+    """Pack the color codes of each row MSB-first with bits per pixel."""
+    per_byte = 8 // bits
+    rows, columns = codes.shape
+    padding = -columns % per_byte
+    if padding:
+        codes = np.pad(codes, ((0, 0), (0, padding)))
+    codes = codes.astype(np.uint8).reshape(rows, -1, per_byte)
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    return np.bitwise_or.reduce(codes << shifts, axis=2).tobytes()
+
+
+def pack_1bit(image, width, height, mirror=False, dither_first=True):
+    """Buffer of getbuffer(), 1 bit per pixel with 1 for white.
+
+    Most drivers dither the image before they rotate it, the others
+    (dither_first False) rotate it first.
+    """
+    if mirror:
+        image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    if not dither_first:
+        image = orient(image, width, height)
+    image = orient(image.convert("1"), width, height)
+    return bytearray(np.packbits(np.asarray(image), axis=1).tobytes())
+
+
+def pack_4gray(image, width, height, mirror=False):
+    """Buffer of getbuffer_4Gray(), 2 bit per pixel from the gray value."""
+    gray = np.asarray(orient(image, width, height, mirror).convert("L"))
+    gray = np.where(gray == 0xC0, 0x80, np.where(gray == 0x80, 0x40, gray))
+    return bytearray(_pack(gray >> 6, 2))
+
+
+def pack_bwr(image, width, height, mirror=False, dither_first=True):
+    """Black and red buffers of the three color panels.
+
+    Red, orange and yellow pixels are drawn to the color plane, which is red
+    or yellow depending on the panel. All other pixels are converted to
+    black and white for the black plane, before or after the rotation like
+    pack_1bit().
+    """
+    if mirror:
+        image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    if not dither_first:
+        image = orient(image, width, height)
+    image = image.convert("RGB")
+    rgb = np.asarray(image).astype(np.int16)
+    red = (rgb[..., 0] >= 128) & (rgb[..., 2] < 128)
+    red &= rgb[..., 0] - rgb[..., 2] >= 64
+    black = np.asarray(image.convert("1")) | red
+    planes = []
+    for plane in (black, ~red):
+        plane = orient(Image.fromarray(plane), width, height)
+        planes.append(bytearray(np.packbits(np.asarray(plane), axis=1).tobytes()))
+    return tuple(planes)
+
+
+def _quantize(image, palette):
+    colors = [value for color in palette for value in color]
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(colors + [0, 0, 0] * (256 - len(palette)))
+    return np.asarray(image.convert("RGB").quantize(palette=palette_image))
+
+
+def pack_7color(image, width, height, mirror=False):
+    """Buffer of the 7 color panels, 4 bit per pixel."""
+    image = orient(image, width, height, mirror)
+    return bytearray(_pack(_quantize(image, PALETTE_7COLOR), 4))
+
+
+def pack_4color(image, width, height, mirror=False):
+    """Buffer of the 4 color panels, 2 bit per pixel."""
+    image = orient(image, width, height, mirror)
+    return bytearray(_pack(_quantize(image, PALETTE_4COLOR), 2))
+
+
+PACKERS = {
+    "bw": pack_1bit,
+    "4gray": pack_4gray,
+    "bwr": pack_bwr,
+    "7color": pack_7color,
+    "4color": pack_4color,
+}
+
+
+def pack_image(panel, image, mirror=False):
+    """Return the display buffer of image for panel.
+
+    The buffer of the "bwr" panels is a tuple of the black and red buffers.
+    """
+    packer = PACKERS[panel.color]
+    if panel.color in ("bw", "bwr"):
+        return packer(image, panel.width, panel.height, mirror, panel.dither_first)
+    return packer(image, panel.width, panel.height, mirror)
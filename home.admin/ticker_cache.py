@@ -0,0 +1,102 @@
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def image_size(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class FrameCache:
+    """LRU cache for rendered frames with a limit on the used bytes.
+
+    The key has to contain everything the frame depends on, e.g. mode, layout,
+    days, inverted, display size and the version of the rendered data.
+    The cached images must not be modified. Other frames, like encoded
+    bytes, can be cached with a size function which returns their bytes.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, size=image_size):
+        self.max_bytes = max_bytes
+        self.size = size
+        self.frames = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    def get(self, key):
+        image = self.frames.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.frames.move_to_end(key)
+        self.hits += 1
+        return image
+
+    def put(self, key, image):
+        size = self.size(image)
+        if size > self.max_bytes:
+            return
+        if key in self.frames:
+            self.used_bytes -= self.size(self.frames.pop(key))
+        self.frames[key] = image
+        self.used_bytes += size
+        while self.used_bytes > self.max_bytes:
+            _, removed = self.frames.popitem(last=False)
+            self.used_bytes -= self.size(removed)
+
+    def retain(self, keep):
+        """Remove all frames for which keep(key) is False."""
+        for key in [key for key in self.frames if not keep(key)]:
+            self.used_bytes -= self.size(self.frames.pop(key))
+
+    def clear(self):
+        self.frames.clear()
+        self.used_bytes = 0
+
+    def stats(self):
+        return (
+            f"frame cache: {self.hits} hits, {self.misses} misses, "
+            f"{len(self.frames)} frames, {self.used_bytes / 1024:.0f} kB"
+        )
+
+
+class PreRenderer:
+    """Renders the views which are likely shown next while the ticker is idle.
+
+    step() renders a single view, so that the main loop can check for key
+    presses in between. New frames are only added while the frame cache uses
+    less than max_bytes.
+    """
+
+    def __init__(self, frame_cache, max_bytes):
+        self.frame_cache = frame_cache
+        self.max_bytes = max_bytes
+        self.rendered = 0
+        self.failed = set()
+
+    def step(self, views, frame_key, render):
+        """Render the first view which is not cached, return False when idle."""
+        if self.frame_cache.used_bytes >= self.max_bytes:
+            return False
+        keys = [frame_key(*view) for view in views]
+        self.failed.intersection_update(keys)
+        for view, key in zip(views, keys, strict=True):
+            if key in self.frame_cache or key in self.failed:
+                continue
+            try:
+                render(*view)
+            except Exception as e:
+                logger.warning(f"Pre-rendering {view} failed: {e}")
+                self.failed.add(key)
+            else:
+                self.rendered += 1
+            return True
+        return False
@@ -0,0 +1,227 @@
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from ticker_history import OHLC_KEYS
+
+# Axes of the default matplotlib figure used by btcticker.chart as fractions
+# of the image: left, top, right, bottom
+SPARK_AXES = (0.125, 0.12, 0.9, 0.89)
+# Space around the data, like the matplotlib axes margins
+MARGIN = 0.05
+# Width of a candle body relative to the space of one candle
+CANDLE_WIDTH = 0.6
+TICK_LENGTH = 3
+FONT_POINTS = 10
+# Least distance of the vertical grid lines in pixels
+GRID_SPACING = 40
+
+
+def _pixels(points, dpi):
+    """Line width in pixels, at least one."""
+    return max(1, round(points * dpi / 72))
+
+
+def _limits(values):
+    lower, upper = float(np.min(values)), float(np.max(values))
+    margin = (upper - lower) * MARGIN or max(abs(lower) * MARGIN, 1.0)
+    return lower - margin, upper + margin
+
+
+def _scale(values, lower, upper, start, end):
+    """Map values between lower and upper onto the pixels from start to end."""
+    values = np.asarray(values, dtype=np.float64)
+    if upper == lower:
+        return np.full(values.shape, round((start + end) / 2), dtype=np.int64)
+    pixels = start + (values - lower) * ((end - start) / (upper - lower))
+    return np.rint(pixels).astype(np.int64)
+
+
+def _dashed_hline(draw, y, x0, x1, pattern, width, fill):
+    x = x0
+    while x <= x1:
+        for i, length in enumerate(pattern):
+            if i % 2 == 0:
+                draw.line((x, y, min(x + length - 1, x1), y), fill=fill, width=width)
+            x += length
+
+
+def _nice_ticks(lower, upper, count):
+    """Round tick values between lower and upper and their step."""
+    raw_step = (upper - lower) / max(1, count)
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(
+        factor * magnitude
+        for factor in (1, 2, 2.5, 5, 10)
+        if factor * magnitude >= raw_step
+    )
+    first = math.ceil(lower / step) * step
+    return np.arange(first, upper + step / 2, step), step
+
+
+def _ohlc_values(ohlc):
+    """Return the open, high, low, close values and the times of the candles.
+
+    ohlc can be a pandas DataFrame like mplfinance takes or the OHLC rows of
+    the btcticker price providers.
+    """
+    if hasattr(ohlc, "columns"):
+        values = np.column_stack(
+            [np.asarray(ohlc[key], dtype=np.float64) for key in OHLC_KEYS[:4]]
+        )
+        times = [time.to_pydatetime() for time in ohlc.index]
+    else:
+        rows = list(ohlc)
+        values = np.array(
+            [[row[key] for key in OHLC_KEYS[:4]] for row in rows], dtype=np.float64
+        ).reshape(-1, 4)
+        times = [row.get("Timestamp") for row in rows]
+    return values, times
+
+
+def _time_label(time, span):
+    if not isinstance(time, datetime):
+        return ""
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc)
+    return time.strftime("%H:%M" if span < 86400 * 2 else "%m-%d")
+
+
+def makeSpark(pricestack, figsize_pixel=(170, 51), dpi=17):
+    """Draw the sparkline of btcticker.chart.makeSpark without matplotlib.
+
+    The mean is drawn as a dash-dotted line, the last price as a red dot.
+    Lines are not anti-aliased, so they stay sharp on e-paper displays.
+    """
+    image = Image.new("RGBA", figsize_pixel, "white")
+    values = np.asarray(pricestack, dtype=np.float64)
+    if not len(values):
+        return image
+    values = values - np.mean(values)
+    width, height = figsize_pixel
+    left, top, right, bottom = (
+        round(SPARK_AXES[0] * width),
+        round(SPARK_AXES[1] * height),
+        round(SPARK_AXES[2] * width) - 1,
+        round(SPARK_AXES[3] * height) - 1,
+    )
+    last = len(values) - 1
+    xs = _scale(
+        np.arange(len(values)), -MARGIN * last, last * (1 + MARGIN), left, right
+    )
+    lower, upper = _limits(values)
+    ys = _scale(values, lower, upper, bottom, top)
+    zero = int(_scale(0.0, lower, upper, bottom, top))
+
+    draw = ImageDraw.Draw(image)
+    # matplotlib scales the dash pattern with the line width of 4 points
+    pattern = [_pixels(4 * length, dpi) for length in (5, 2, 1, 2)]
+    _dashed_hline(draw, zero, left, right, pattern, _pixels(4, dpi), "black")
+    points = list(zip(xs.tolist(), ys.tolist(), strict=True))
+    if len(points) > 1:
+        draw.line(points, fill="black", width=_pixels(6, dpi))
+    radius = max(1, _pixels(6, dpi) // 2)
+    x, y = points[-1]
+    draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill="red")
+    return image
+
+
+def makeCandle(ohlc, figsize_pixel=(170, 51), dpi=17, plot_type="candle", x_axis=True):
+    """Draw the chart of btcticker.chart.makeCandle without matplotlib.
+
+    plot_type is candle, ohlc or line. The price ticks are drawn on the left
+    and a grid is drawn at every tick, like the mplfinance default style.
+    """
+    if plot_type not in ("candle", "ohlc", "line"):
+        raise ValueError(f"Unknown plot_type {plot_type}")
+    image = Image.new("RGBA", figsize_pixel, "white")
+    values, times = _ohlc_values(ohlc)
+    if not len(values):
+        return image
+    width, height = figsize_pixel
+    font = ImageFont.load_default(_pixels(FONT_POINTS, dpi))
+    text_height = font.getbbox("0")[3]
+
+    lower, upper = _limits(values[:, 1:3])
+    ticks, step = _nice_ticks(lower, upper, max(2, height // (3 * text_height)))
+    decimals = max(0, -math.floor(math.log10(step)))
+    labels = [f"{tick:.{decimals}f}" for tick in ticks]
+    label_width = max(font.getbbox(label)[2] for label in labels)
+    left = label_width + TICK_LENGTH + 2
+    top = text_height // 2
+    right = width - 2
+    bottom = height - 1 - (text_height + TICK_LENGTH + 2 if x_axis else 1)
+
+    draw = ImageDraw.Draw(image)
+    ys = _scale(ticks, lower, upper, bottom, top)
+    for y, label in zip(ys.tolist(), labels, strict=True):
+        draw.line((left, y, right, y), fill="black")
+        draw.line((left - TICK_LENGTH, y, left, y), fill="black")
+        draw.text(
+            (left - TICK_LENGTH - 1, y), label, fill="black", font=font, anchor="rm"
+        )
+
+    count = len(values)
+    slot = (right - left) / count
+    centers = np.rint(left + (np.arange(count) + 0.5) * slot).astype(np.int64)
+    every = max(1, math.ceil(max(GRID_SPACING, 2 * label_width) / slot))
+    first_time = times[0] if isinstance(times[0], datetime) else None
+    last_time = times[-1] if isinstance(times[-1], datetime) else None
+    span = (last_time - first_time).total_seconds() if first_time and last_time else 0
+    for i in range(every // 2, count, every):
+        x = int(centers[i])
+        draw.line((x, top, x, bottom), fill="black")
+        if x_axis:
+            draw.line((x, bottom, x, bottom + TICK_LENGTH), fill="black")
+            draw.text(
+                (x, bottom + TICK_LENGTH + 1),
+                _time_label(times[i], span),
+                fill="black",
+                font=font,
+                anchor="mt",
+            )
+
+    opens, highs, lows, closes = (
+        _scale(values[:, column], lower, upper, bottom, top) for column in range(4)
+    )
+    if plot_type == "line":
+        points = list(zip(centers.tolist(), closes.tolist(), strict=True))
+        if len(points) > 1:
+            draw.line(points, fill="black", width=_pixels(1.5, dpi))
+    else:
+        half = max(1, round(slot * CANDLE_WIDTH)) // 2
+        for x, o, h, lo, c, up in zip(
+            centers.tolist(),
+            opens.tolist(),
+            highs.tolist(),
+            lows.tolist(),
+            closes.tolist(),
+            (values[:, 3] >= values[:, 0]).tolist(),
+            strict=True,
+        ):
+            if plot_type == "ohlc":
+                draw.line((x, h, x, lo), fill="black")
+                draw.line((x - half, o, x, o), fill="black")
+                draw.line((x, c, x + half, c), fill="black")
+                continue
+            # Pixel y grows downwards, the top of the body is the higher price
+            body_top, body_bottom = min(o, c), max(o, c)
+            draw.line((x, h, x, body_top), fill="black")
+            draw.line((x, body_bottom, x, lo), fill="black")
+            draw.rectangle(
+                (x - half, body_top, x + half, body_bottom),
+                fill="white" if up else "black",
+                outline="black",
+            )
+    draw.rectangle((left, top, right, bottom), outline="black")
+    return image
+
+
+def install():
+    """Draw the charts of btcticker with this module instead of matplotlib."""
+    from btcticker.render import image_renderer
+
+    image_renderer.makeSpark = makeSpark
+    image_renderer.makeCandle = makeCandle
@@ -0,0 +1,40 @@
+from configparser import ConfigParser
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict
+
+
+class DaemonConfig(BaseModel):
+    """Settings of the [Main] section, which btcticker does not know.
+
+    Most are only used by the ticker daemons, server_address, server_port
+    and render_workers by tickerServer.py, record_to and replay_from by all
+    scripts, see ticker_archive.
+    """
+
+    model_config = ConfigDict(extra="ignore")
+
+    frame_cache_size: int = 8
+    prerender: bool = False
+    partial_refresh: int = 0
+    interaction_time: float = 0
+    refresh_budget: float = 60
+    framebuffer: str = ""
+    framebuffer_rotate: bool = False
+    cache_dir: str = "/var/cache/btcticker"
+    chart_engine: Literal["matplotlib", "native"] = "matplotlib"
+    server_address: str = ""
+    server_port: int = 8080
+    render_workers: int = 2
+    record_to: str = ""
+    replay_from: str = ""
+    replay_latency: float = 0.0
+    replay_jitter: float = 0.0
+
+
+def load_daemon_config(config):
+    parser = ConfigParser()
+    parser.read(config.path)
+    if not parser.has_section("Main"):
+        return DaemonConfig()
+    return DaemonConfig(**parser["Main"])
@@ -0,0 +1,279 @@
+import inspect
+import logging
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from ticker_buffer import pack_image
+from ticker_epd import get_driver, get_panel
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_METHODS = ("display_Partial", "displayPartial")
+BASE_METHODS = ("display_Base", "displayPartBaseImage")
+
+
+def changed_box(old, new, bytes_per_row):
+    """Bounding box of the changed bytes between two 1-bit panel buffers.
+
+    Returns (x_start, y_start, x_end, y_end) in panel pixels, with x aligned
+    to whole bytes and exclusive ends, or None when nothing has changed.
+    """
+    old = np.frombuffer(bytes(old), dtype=np.uint8).reshape(-1, bytes_per_row)
+    new = np.frombuffer(bytes(new), dtype=np.uint8).reshape(-1, bytes_per_row)
+    diff = old != new
+    rows = np.flatnonzero(diff.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    return (
+        int(cols[0]) * 8,
+        int(rows[0]),
+        (int(cols[-1]) + 1) * 8,
+        int(rows[-1]) + 1,
+    )
+
+
+class EinkDisplay:
+    """Writes frames to an e-paper panel.
+
+    The last frame pushed to the panel is kept. A frame whose packed buffer
+    equals it is already on the glass, it is skipped without waking the
+    panel and counted in skipped. When partial_refresh is set and the
+    driver supports it, the following frames are written with a partial
+    refresh of the changed region. After partial_refresh partial updates, a
+    full refresh is done again to remove the ghosting.
+
+    A frame drawn with keep_awake leaves the panel initialized, the next
+    frame of the same kind is written without init() until sleep() is
+    called.
+    """
+
+    def __init__(self, epd_type, partial_refresh=0):
+        self.epd_type = epd_type
+        self.partial_refresh = partial_refresh
+        self.last_buffer = None
+        self.partial_count = 0
+        self.skipped = 0
+        # "full" or "partial" while the panel is awake, None while it sleeps
+        self.awake = None
+
+    def _method(self, epd, names):
+        for name in names:
+            if hasattr(epd, name):
+                return getattr(epd, name)
+        return None
+
+    def _use_partial(self, epd, panel, buffer):
+        if not self.partial_refresh or not panel.partial or panel.color != "bw":
+            return False
+        if self.last_buffer is None:
+            return False
+        if self.partial_count >= self.partial_refresh:
+            return False
+        if self._method(epd, PARTIAL_METHODS) is None:
+            return False
+        return len(buffer) == len(self.last_buffer)
+
+    def draw(self, image=None, keep_awake=False):
+        panel = get_panel(self.epd_type)
+        epd = get_driver(self.epd_type)
+        if image is None:
+            image = Image.new("L", (panel.height, panel.width), 255)
+        buffer = pack_image(panel, image)
+        if buffer == self.last_buffer:
+            self.skipped += 1
+            logger.info(f"draw skipped, frame has not changed ({self.skipped} skipped)")
+            if not keep_awake:
+                self.sleep()
+            return
+
+        try:
+            if self._use_partial(epd, panel, buffer):
+                self._draw_partial(epd, panel, buffer)
+            else:
+                self._draw_full(epd, panel, buffer)
+        except Exception:
+            # A failed write leaves an unknown frame on the glass
+            self.last_buffer = None
+            self.awake = None
+            raise
+        if not keep_awake:
+            self.sleep()
+
+    def sleep(self):
+        """Put the panel to deep sleep, if it is awake."""
+        if self.awake is not None:
+            self.awake = None
+            get_driver(self.epd_type).sleep()
+
+    def _init(self, kind, init, *args):
+        """Call init(*args), unless the panel is awake for the same kind of
+        refresh."""
+        if self.awake == kind:
+            return
+        self.awake = None
+        init(*args)
+        self.awake = kind
+
+    def _draw_full(self, epd, panel, buffer):
+        if panel.Init4Gray:
+            self._init("full", epd.Init_4Gray)
+        elif panel.Use4Gray:
+            self._init("full", epd.init, 0)
+        elif panel.FullUpdate:
+            self._init("full", epd.init, epd.FULL_UPDATE)
+        else:
+            self._init("full", epd.init)
+        logger.info("draw")
+        base = self._method(epd, BASE_METHODS)
+        if panel.Use4Gray:
+            epd.display_4Gray(buffer)
+        elif panel.color == "bwr":
+            epd.display(*buffer)
+        elif self.partial_refresh and panel.partial and base is not None:
+            # Also sets the reference image for the following partial updates
+            base(buffer)
+        else:
+            epd.display(buffer)
+        self.last_buffer = buffer
+        self.partial_count = 0
+
+    def _draw_partial(self, epd, panel, buffer):
+        box = changed_box(self.last_buffer, buffer, (panel.width + 7) // 8)
+        if panel.FullUpdate:
+            self._init("partial", epd.init, epd.PART_UPDATE)
+        else:
+            self._init("partial", epd.init)
+        logger.info(f"partial draw of {box}")
+        partial = self._method(epd, PARTIAL_METHODS)
+        if len(inspect.signature(partial).parameters) >= 5:
+            partial(buffer, *box)
+        else:
+            partial(buffer)
+        self.last_buffer = buffer
+        self.partial_count += 1
+
+
+class DisplayWriter(threading.Thread):
+    """Writes the frames to the display in the background.
+
+    A frame is passed through a single slot. A frame which is submitted
+    while the display is busy replaces the one waiting in the slot, so only
+    the newest frame is written after the current one. The time from
+    submit() until the frame is on the glass is logged. on_idle is called
+    when the slot is empty after a write.
+
+    A warm frame, e.g. after a key press, opens an interaction window of
+    warm_time seconds. The frames written within it are drawn with
+    keep_awake, sleep() is called when the window has closed.
+    """
+
+    def __init__(self, draw, on_idle=None, sleep=None, warm_time=0):
+        super().__init__(daemon=True)
+        self.draw = draw
+        self.on_idle = on_idle
+        self.sleep = sleep
+        self.warm_time = warm_time
+        self.written = 0
+        self.replaced = 0
+        self.failed = 0
+        self.last_latency = None
+        self.max_latency = 0
+        self._slot = None
+        self._sleep_at = None
+        self._writing = False
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def submit(self, image, on_shown=None, warm=False):
+        """Queue image, on_shown is called once it has been written."""
+        with self._condition:
+            if self._slot is not None:
+                self.replaced += 1
+            self._slot = (image, on_shown, warm, time.monotonic())
+            self._condition.notify_all()
+
+    @property
+    def busy(self):
+        """True while a frame is written or waiting to be written."""
+        with self._condition:
+            return self._writing or self._slot is not None
+
+    def wait_idle(self, timeout=None):
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._writing and self._slot is None, timeout
+            )
+
+    def stop(self):
+        """Stop after the waiting frame has been written."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _wait_timeout(self):
+        if self._sleep_at is None:
+            return None
+        return max(0, self._sleep_at - time.monotonic())
+
+    def _close_window(self):
+        try:
+            self.sleep()
+        except Exception as e:
+            logger.warning(f"Putting the display to sleep failed: {e}")
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._slot is not None or self._stopped,
+                    self._wait_timeout(),
+                )
+                slot = self._slot
+                self._slot = None
+                close_window = slot is None and self._sleep_at is not None
+                if close_window:
+                    self._sleep_at = None
+                elif slot is not None:
+                    warm = slot[2]
+                    now = time.monotonic()
+                    if warm and self.sleep is not None and self.warm_time > 0:
+                        self._sleep_at = now + self.warm_time
+                    elif self._sleep_at is not None and now >= self._sleep_at:
+                        self._sleep_at = None
+                    self._writing = True
+            if slot is None:
+                if close_window:
+                    self._close_window()
+                if self._stopped:
+                    return
+                continue
+            image, on_shown, _, queued = slot
+            try:
+                self.draw(image, self._sleep_at is not None)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Writing the frame failed: {e}")
+            else:
+                self.written += 1
+                self.last_latency = time.monotonic() - queued
+                self.max_latency = max(self.max_latency, self.last_latency)
+                logger.info(self.stats())
+                if on_shown is not None:
+                    on_shown()
+            with self._condition:
+                self._writing = False
+                idle = self._slot is None
+                self._condition.notify_all()
+            if idle and self.on_idle is not None:
+                self.on_idle()
+
+    def stats(self):
+        return (
+            f"display: {self.written} written, {self.replaced} replaced, "
+            f"{self.failed} failed, latency {self.last_latency:.2f} s "
+            f"(max {self.max_latency:.2f} s)"
+        )
@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from pymempool import DifficultyAdjustment, MempoolAPI, RecommendedFees
+
+logger = logging.getLogger(__name__)
+
+# Used when mempool_api_url has no url, as by btcticker
+DEFAULT_API_URL = (
+    "https://mempool.space/api/,https://mempool.emzy.de/api/,"
+    "https://mempool.bitcoin-21.org/api/"
+)
+
+
+def split_api_url(api_url):
+    """The urls of a comma separated mempool_api_url, the default ones when it
+    has none."""
+    urls = [url.strip() for url in (api_url or "").split(",") if url.strip()]
+    if not urls:
+        logger.warning(f"mempool_api_url has no url, using {DEFAULT_API_URL}")
+        urls = DEFAULT_API_URL.split(",")
+    return urls
+
+
+class HostStats:
+    """Moving latency and error rate of one api url."""
+
+    def __init__(self, window):
+        self.latency = None
+        self.latencies = deque(maxlen=window)
+        self.error_rate = 0.0
+        self.last_failure = None
+        self.answers = 0
+        self.errors = 0
+
+
+class EndpointSelector:
+    """Ranks the hosts of a mempool_api_url list and fetches from the best.
+
+    Every answer updates an exponential moving average of the latency of its
+    host, every answer and failure one of its error rate. Failures are
+    forgotten with a half life of error_half_life seconds, so a host which
+    was down is tried again. A request goes to the best ranked host. When it
+    has not answered after the percentile of its recent latencies, the same
+    request is sent to the runner-up and the first answer is taken. A failed
+    host is replaced by the next one right away.
+
+    start_budget() limits all requests until the next call to a total time,
+    requests which would exceed it fail with a TimeoutError.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        alpha=0.3,
+        window=20,
+        percentile=0.9,
+        min_hedge_delay=0.3,
+        max_hedge_delay=5.0,
+        default_latency=1.0,
+        error_penalty=10.0,
+        error_half_life=300,
+    ):
+        self.api_urls = split_api_url(api_url)
+        self.alpha = alpha
+        self.percentile = percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.default_latency = default_latency
+        self.error_penalty = error_penalty
+        self.error_half_life = error_half_life
+        self.hosts = {url: HostStats(window) for url in self.api_urls}
+        self.hedged = 0
+        self._deadline = None
+        self._lock = threading.Lock()
+        # Hedged requests which lost keep running until their timeout
+        self._pool = ThreadPoolExecutor(
+            4 * len(self.api_urls), thread_name_prefix="endpoint"
+        )
+
+    def start_budget(self, seconds):
+        """Let the following requests take seconds in total."""
+        self._deadline = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left of the budget, None without one."""
+        if self._deadline is None:
+            return None
+        return self._deadline - time.monotonic()
+
+    def score(self, url):
+        """Expected seconds until url answers, lower is better."""
+        stats = self.hosts[url]
+        latency = self.default_latency if stats.latency is None else stats.latency
+        if stats.last_failure is None:
+            return latency
+        age = time.monotonic() - stats.last_failure
+        error_rate = stats.error_rate * 0.5 ** (age / self.error_half_life)
+        return latency + self.error_penalty * error_rate
+
+    def ranked(self):
+        """The api urls from the best to the worst, in the configured order
+        while they score the same."""
+        with self._lock:
+            return sorted(self.api_urls, key=self.score)
+
+    def hedge_delay(self, url):
+        """Seconds to wait for url before the request is hedged."""
+        with self._lock:
+            latencies = sorted(self.hosts[url].latencies)
+        if not latencies:
+            return self.max_hedge_delay
+        delay = latencies[
+            min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        ]
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    def record(self, url, latency=None, error=None):
+        with self._lock:
+            stats = self.hosts[url]
+            failed = error is not None
+            stats.error_rate += self.alpha * (failed - stats.error_rate)
+            if failed:
+                stats.errors += 1
+                stats.last_failure = time.monotonic()
+                return
+            stats.answers += 1
+            stats.latencies.append(latency)
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += self.alpha * (latency - stats.latency)
+
+    def _timed(self, request, url, name):
+        start = time.monotonic()
+        try:
+            result = request(url)
+        except Exception as e:
+            logger.info(f"Request of {name} at {url} failed: {e}")
+            self.record(url, error=e)
+            raise
+        self.record(url, time.monotonic() - start)
+        return result
+
+    def fetch(self, request, name):
+        """Return request(api_url) of the first host which answers.
+
+        name describes the request in the log. Raises the error of the last
+        host when all of them failed.
+        """
+        candidates = self.ranked()
+        pending = {}
+        last_error = None
+        hedge_at = 0
+        while True:
+            now = time.monotonic()
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"No answer for {name} within the refresh budget")
+            if candidates and (not pending or (len(pending) < 2 and now >= hedge_at)):
+                url = candidates.pop(0)
+                if pending:
+                    self.hedged += 1
+                    logger.info(f"Hedging the request of {name} to {url}")
+                future = self._pool.submit(self._timed, request, url, name)
+                pending[future] = url
+                hedge_at = now + self.hedge_delay(url)
+            if not pending:
+                raise last_error
+            timeout = remaining
+            if candidates and len(pending) < 2:
+                hedge_in = hedge_at - now
+                timeout = hedge_in if timeout is None else min(timeout, hedge_in)
+            done, _ = wait(pending, timeout, FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+                    hedge_at = 0
+
+    def stats(self):
+        hosts = []
+        for url, stats in self.hosts.items():
+            latency = "-" if stats.latency is None else f"{stats.latency * 1000:.0f} ms"
+            errors = f", {stats.errors} errors" if stats.errors else ""
+            hosts.append(f"{urlsplit(url).netloc} {latency}{errors}")
+        return f"endpoints: {'; '.join(hosts)}, {self.hedged} hedged"
+
+
+class HedgedMempoolAPI:
+    """pymempool client which sends its requests through an EndpointSelector.
+
+    Every host has a MempoolAPI of its own, so the rate limits, the response
+    cache and the decoding of pymempool are kept. The get_* methods are
+    called on the client of the best ranked host, only the failover between
+    the hosts is replaced.
+    """
+
+    def __init__(self, selector, **kwargs):
+        self.selector = selector
+        self.clients = {
+            url: MempoolAPI(api_base_url=[url], **kwargs) for url in selector.api_urls
+        }
+
+    def configure(self, **attributes):
+        """Set attributes like session or reading_timeout of every client."""
+        for client in self.clients.values():
+            for name, value in attributes.items():
+                setattr(client, name, value)
+
+    def __getattr__(self, name):
+        if not name.startswith("get_"):
+            raise AttributeError(name)
+
+        def request(*args, **kwargs):
+            return self.selector.fetch(
+                lambda url: getattr(self.clients[url], name)(*args, **kwargs), name
+            )
+
+        return request
+
+
+class HedgedMempool:
+    """Replacement of the btcticker Mempool, which fetches through an
+    EndpointSelector.
+
+    getData() returns the same data as Mempool. Unlike Mempool, nothing is
+    fetched before the first refresh().
+    """
+
+    def __init__(self, selector):
+        self.mempool = HedgedMempoolAPI(selector)
+        self.min_refresh_time = 0
+        self.data = {}
+
+    def refresh(self):
+        api = self.mempool
+        tip_hash = api.get_block_tip_hash()
+        last_block = api.get_block(tip_hash)
+        height = api.get_block_tip_height()
+        fees = RecommendedFees(api.get_recommended_fees(), api.get_mempool_blocks_fee())
+        difficulty = DifficultyAdjustment(height, api.get_difficulty_adjustment())
+        retarget_block = api.get_block(api.get_block_height(difficulty.last_retarget))
+        min_fee, median_fee, max_fee = fees.build_fee_array()
+        self.data = {
+            "timestamp": time.time(),
+            "count": fees.mempool_tx_count,
+            "vsize": fees.mempool_vsize,
+            "minFee": min_fee,
+            "maxFee": max_fee,
+            "bestFees": {
+                "fastestFee": fees.fastest_fee,
+                "halfHourFee": fees.half_hour_fee,
+                "hourFee": fees.hour_fee,
+            },
+            "medianFee": median_fee,
+            "blocks": fees.mempool_blocks,
+            "last_block": last_block,
+            "retarget_block": retarget_block,
+            "last_retarget": difficulty.last_retarget,
+            "minutes_between_blocks": difficulty.minutes_between_blocks,
+            "height": height,
+            "tip_hash": tip_hash,
+        }
+
+    def getData(self):
+        return self.data
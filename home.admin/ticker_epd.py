@@ -1,238 +1,127 @@
-def get_epd(epd_type):  # noqa: C901
-    epd = None
-    mirror = False
-    width_first = True
-    Use4Gray = False
-    Init4Gray = False
-    FullUpdate = False
-
-    if epd_type == "1in02":
-        from waveshare_epd import epd1in02
-
-        epd = epd1in02.EPD()
-    elif epd_type == "1in54":
-        from waveshare_epd import epd1in54
-
-        epd = epd1in54.EPD()
-    elif epd_type == "1in54_V2":
-        from waveshare_epd import epd1in54
-
-        epd = epd1in54_V2.EPD()
-    elif epd_type == "1in54b":
-        from waveshare_epd import epd1in54b
-
-        epd = epd1in54b.EPD()
-    elif epd_type == "1in54b_V2":
-        from waveshare_epd import epd1in54b_V2
-
-        epd = epd1in54b_V2.EPD()
-    elif epd_type == "1in54c":
-        from waveshare_epd import epd1in54c
-
-        epd = epd1in54c.EPD()
-    elif epd_type == "1in64g":
-        from waveshare_epd import epd1in64g
-
-        epd = epd1in64g.EPD()
-    elif epd_type == "2in13":
-        from waveshare_epd import epd2in13
-
-        epd = epd2in13.EPD()
-    elif epd_type == "2in13_V2":
-        from waveshare_epd import epd2in13_V2
-
-        epd = epd2in13_V2.EPD()
-    elif epd_type == "2in13_V3":
-        from waveshare_epd import epd2in13_V3
-
-        epd = epd2in13_V3.EPD()
-    elif epd_type == "2in13b_V3":
-        from waveshare_epd import epd2in13b_V3
-
-        epd = epd2in13b_V3.EPD()
-    elif epd_type == "2in13b_V4":
-        from waveshare_epd import epd2in13b_V4
-
-        epd = epd2in13b_V4.EPD()
-    elif epd_type == "2in13bc":
-        from waveshare_epd import epd2in13bc
-
-        epd = epd2in13bc.EPD()
-    elif epd_type == "2in13d":
-        from waveshare_epd import epd2in13d
-
-        epd = epd2in13d.EPD()
-    elif epd_type == "2in36g":
-        from waveshare_epd import epd2in36g
-
-        epd = epd2in36g.EPD()
-    elif epd_type == "2in66":
-        from waveshare_epd import epd2in66
-
-        epd = epd2in66.EPD()
-    elif epd_type == "2in66b":
-        from waveshare_epd import epd2in66b
-
-        epd = epd2in66b.EPD()
-    elif epd_type == "2in7":
-        from waveshare_epd import epd2in7
-
-        epd = epd2in7.EPD()
-    elif epd_type == "2in7_V2":
-        from waveshare_epd import epd2in7_V2
-
-        epd = epd2in7_V2.EPD()
-    elif epd_type == "2in7b":
-        from waveshare_epd import epd2in7b
-
-        epd = epd2in7b.EPD()
-    elif epd_type == "2in7b_V2":
-        from waveshare_epd import epd2in7b_V2
-
-        epd = epd2in7b_V2.EPD()
-    elif epd_type == "2in9":
-        from waveshare_epd import epd2in9
-
-        epd = epd2in9.EPD()
-    elif epd_type == "2in9_V2":
-        from waveshare_epd import epd2in9_V2
-
-        epd = epd2in9_V2.EPD()
-    elif epd_type == "2in9b_V3":
-        from waveshare_epd import epd2in9b_V3
-
-        epd = epd2in9b_V3.EPD()
-    elif epd_type == "2in9bc":
-        from waveshare_epd import epd2in9bc
-
-        epd = epd2in9bc.EPD()
-    elif epd_type == "2in9d":
-        from waveshare_epd import epd2in9d
-
-        epd = epd2in9d.EPD()
-    elif epd_type == "3in0g":
-        from waveshare_epd import epd3in0g
-
-        epd = epd3in0g.EPD()
-    elif epd_type == "3in52":
-        from waveshare_epd import epd3in52
-
-        epd = epd3in52.EPD()
-    elif epd_type == "3in7":
-        from waveshare_epd import epd3in7
-
-        Use4Gray = True
-        epd = epd3in7.EPD()
-    elif epd_type == "4in01f":
-        from waveshare_epd import epd4in01f
-
-        epd = epd4in01f.EPD()
-    elif epd_type == "4in2":
-        from waveshare_epd import epd4in2
-
-        epd = epd4in2.EPD()
-    elif epd_type == "4in2b_V2":
-        from waveshare_epd import epd4in2b_V2
-
-        epd = epd4in2b_V2.EPD()
-    elif epd_type == "4in2bc":
-        from waveshare_epd import epd4in2bc
-
-        epd = epd4in2bc.EPD()
-    elif epd_type == "4in37g":
-        from waveshare_epd import epd4in37g
-
-        epd = epd4in37g.EPD()
-    elif epd_type == "5in65f":
-        from waveshare_epd import epd5in65f
-
-        epd = epd5in65f.EPD()
-    elif epd_type == "5in83":
-        from waveshare_epd import epd5in83
-
-        epd = epd5in83.EPD()
-    elif epd_type == "5in83_V2":
-        from waveshare_epd import epd5in83_V2
-
-        epd = epd5in83_V2.EPD()
-    elif epd_type == "5in83b_V2":
-        from waveshare_epd import epd5in83b_V2
-
-        epd = epd5in83b_V2.EPD()
-    elif epd_type == "5in83bc":
-        from waveshare_epd import epd5in83bc
-
-        epd = epd5in83bc.EPD()
-    elif epd_type == "7in3f":
-        from waveshare_epd import epd7in3f
-
-        epd = epd7in3f.EPD()
-    elif epd_type == "7in3g":
-        from waveshare_epd import epd7in3g
-
-        epd = epd7in3g.EPD()
-    elif epd_type == "7in5":
-        from waveshare_epd import epd7in5
-
-        epd = epd7in5.EPD()
-        width_first = False
-    elif epd_type == "7in5_HD":
-        from waveshare_epd import epd7in5_HD
-
-        epd = epd7in5_HD.EPD()
-        width_first = False
-    elif epd_type == "7in5_V2":
-        from waveshare_epd import epd7in5_V2
-
-        width_first = False
-        epd = epd7in5_V2.EPD()
-    elif epd_type == "7in5b_HD":
-        from waveshare_epd import epd7in5b_HD
-
-        width_first = False
-        epd = epd7in5b_HD.EPD()
-    elif epd_type == "7in5b_V2":
-        from waveshare_epd import epd7in5b_V2
-
-        epd = epd7in5b_V2.EPD()
-        width_first = False
-    elif epd_type == "7in5bc":
-        from waveshare_epd import epd7in5bc
-
-        epd = epd7in5bc.EPD()
-        width_first = False
-    elif epd_type == "TP_epd2in13_V2":
-        from TP_lib import epd2in13_V2 as TP_epd2in13_V2
-
-        epd = TP_epd2in13_V2.EPD()
-        FullUpdate = True
-    elif epd_type == "TP_epd2in13_V3":
-        from TP_lib import epd2in13_V3 as TP_epd2in13_V3
-
-        epd = TP_epd2in13_V3.EPD()
-        FullUpdate = True
-    elif epd_type == "TP_epd2in13_V4":
-        from TP_lib import epd2in13_V4 as TP_epd2in13_V4
-
-        epd = TP_epd2in13_V4.EPD()
-        FullUpdate = True
-    elif epd_type == "TP_epd2in9_V2":
-        from TP_lib import epd2in9_V2 as TP_epd2in9_V2
-
-        epd = TP_epd2in9_V2.EPD()
-        FullUpdate = True
-    elif epd_type == "2in7_4gray":
-        from waveshare_epd import epd2in7
-
-        epd = epd2in7.EPD()
-        Use4Gray = True
-        Init4Gray = True
-    elif epd_type == "3in7_4gray":
-        from waveshare_epd import epd3in7
-
-        epd = epd3in7.EPD()
-        Use4Gray = True
-        Init4Gray = True
+import importlib
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Panel:
+    """Description of a supported e-paper panel.
+
+    width and height are the native resolution of the driver (epd.width and
+    epd.height). color is one of "bw" (1 bit), "4gray" (2 bit grayscale),
+    "bwr" (black and red/yellow planes), "4color" (2 bit) or "7color"
+    (4 bit). partial is set for panels whose driver has a partial refresh.
+    dither_first is cleared for the "bw" and "bwr" panels whose getbuffer()
+    rotates the image before it converts it to 1 bit.
+    """
+
+    module: str
+    width: int
+    height: int
+    color: str = "bw"
+    width_first: bool = True
+    Use4Gray: bool = False
+    Init4Gray: bool = False
+    FullUpdate: bool = False
+    partial: bool = False
+    dither_first: bool = True
+
+
+def _waveshare(name, width, height, **kwargs):
+    return Panel(f"waveshare_epd.epd{name}", width, height, **kwargs)
+
+
+def _tp(name, width, height, **kwargs):
+    return Panel(f"TP_lib.epd{name}", width, height, FullUpdate=True, **kwargs)
+
+
+PANELS = {
+    "1in02": _waveshare("1in02", 80, 128),
+    "1in54": _waveshare("1in54", 200, 200),
+    "1in54_V2": _waveshare("1in54_V2", 200, 200),
+    "1in54b": _waveshare("1in54b", 200, 200, color="bwr"),
+    "1in54b_V2": _waveshare("1in54b_V2", 200, 200, color="bwr"),
+    "1in54c": _waveshare("1in54c", 152, 152, color="bwr"),
+    "1in64g": _waveshare("1in64g", 168, 168, color="4color"),
+    "2in13": _waveshare("2in13", 122, 250),
+    "2in13_V2": _waveshare("2in13_V2", 122, 250, partial=True),
+    "2in13_V3": _waveshare("2in13_V3", 122, 250, partial=True, dither_first=False),
+    "2in13b_V3": _waveshare("2in13b_V3", 104, 212, color="bwr"),
+    "2in13b_V4": _waveshare("2in13b_V4", 122, 250, color="bwr", dither_first=False),
+    "2in13bc": _waveshare("2in13bc", 104, 212, color="bwr"),
+    "2in13d": _waveshare("2in13d", 104, 212),
+    "2in36g": _waveshare("2in36g", 168, 296, color="4color"),
+    "2in66": _waveshare("2in66", 152, 296),
+    "2in66b": _waveshare("2in66b", 152, 296, color="bwr"),
+    "2in7": _waveshare("2in7", 176, 264),
+    "2in7_V2": _waveshare("2in7_V2", 176, 264, partial=True),
+    "2in7b": _waveshare("2in7b", 176, 264, color="bwr"),
+    "2in7b_V2": _waveshare("2in7b_V2", 176, 264, color="bwr"),
+    "2in9": _waveshare("2in9", 128, 296),
+    "2in9_V2": _waveshare("2in9_V2", 128, 296, partial=True),
+    "2in9b_V3": _waveshare("2in9b_V3", 128, 296, color="bwr"),
+    "2in9bc": _waveshare("2in9bc", 128, 296, color="bwr"),
+    "2in9d": _waveshare("2in9d", 128, 296),
+    "3in0g": _waveshare("3in0g", 168, 400, color="4color"),
+    "3in52": _waveshare("3in52", 240, 360),
+    "3in7": _waveshare("3in7", 280, 480, color="4gray", Use4Gray=True),
+    "4in01f": _waveshare("4in01f", 640, 400, color="7color"),
+    "4in2": _waveshare("4in2", 400, 300),
+    "4in2b_V2": _waveshare("4in2b_V2", 400, 300, color="bwr"),
+    "4in2bc": _waveshare("4in2bc", 400, 300, color="bwr"),
+    "4in37g": _waveshare("4in37g", 512, 368, color="4color"),
+    "5in65f": _waveshare("5in65f", 600, 448, color="7color"),
+    "5in83": _waveshare("5in83", 600, 448),
+    "5in83_V2": _waveshare("5in83_V2", 648, 480),
+    "5in83b_V2": _waveshare("5in83b_V2", 648, 480, color="bwr"),
+    "5in83bc": _waveshare("5in83bc", 600, 448, color="bwr"),
+    "7in3f": _waveshare("7in3f", 800, 480, color="7color"),
+    "7in3g": _waveshare("7in3g", 800, 480, color="4color"),
+    "7in5": _waveshare("7in5", 640, 384, width_first=False),
+    "7in5_HD": _waveshare("7in5_HD", 880, 528, width_first=False, dither_first=False),
+    "7in5_V2": _waveshare("7in5_V2", 800, 480, width_first=False, dither_first=False),
+    "7in5b_HD": _waveshare("7in5b_HD", 880, 528, color="bwr", width_first=False),
+    "7in5b_V2": _waveshare(
+        "7in5b_V2", 800, 480, color="bwr", width_first=False, dither_first=False
+    ),
+    "7in5bc": _waveshare("7in5bc", 640, 384, color="bwr", width_first=False),
+    "TP_epd2in13_V2": _tp("2in13_V2", 122, 250, partial=True),
+    "TP_epd2in13_V3": _tp("2in13_V3", 122, 250, partial=True, dither_first=False),
+    "TP_epd2in13_V4": _tp("2in13_V4", 122, 250, partial=True, dither_first=False),
+    "TP_epd2in9_V2": _tp("2in9_V2", 128, 296, partial=True),
+    "2in7_4gray": _waveshare(
+        "2in7", 176, 264, color="4gray", Use4Gray=True, Init4Gray=True
+    ),
+    "3in7_4gray": _waveshare(
+        "3in7", 280, 480, color="4gray", Use4Gray=True, Init4Gray=True
+    ),
+}
+
+# The drivers are only created once, as their creation sets up the GPIOs
+_drivers = {}
+
+
+def get_panel(epd_type):
+    """Return the Panel of epd_type, without importing its driver."""
+    try:
+        return PANELS[epd_type]
+    except KeyError:
+        raise Exception("Wrong epd_type") from None
+
+
+def display_size(panel, orientation=0):
+    """Width and height of the Ticker for panel, as used by tickerEink."""
+    if panel.width_first:
+        width, height = panel.width, panel.height
     else:
-        raise Exception("Wrong epd_type")
-    return epd, mirror, width_first, Use4Gray, Init4Gray, FullUpdate
+        width, height = panel.height, panel.width
+    if orientation in (90, 270):
+        return height, width
+    return width, height
+
+
+def get_driver(epd_type):
+    """Return the driver instance of epd_type, which is created on first use."""
+    panel = get_panel(epd_type)
+    if epd_type not in _drivers:
+        _drivers[epd_type] = importlib.import_module(panel.module).EPD()
+    return _drivers[epd_type]
@@ -0,0 +1,118 @@
+import logging
+import mmap
+import os
+import stat
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+def _read_sysfs(name, attribute):
+    try:
+        with open(f"/sys/class/graphics/{name}/{attribute}") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def to_rgb565(rgb):
+    r = rgb[..., 0].astype(np.uint16)
+    g = rgb[..., 1].astype(np.uint16)
+    b = rgb[..., 2].astype(np.uint16)
+    pixels = ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+    return pixels.astype("<u2").view(np.uint8).reshape(rgb.shape[0], -1)
+
+
+def to_xrgb8888(rgb):
+    pixels = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    # little endian XRGB8888 is stored as B, G, R, X
+    pixels[..., 0] = rgb[..., 2]
+    pixels[..., 1] = rgb[..., 1]
+    pixels[..., 2] = rgb[..., 0]
+    pixels[..., 3] = 255
+    return pixels.reshape(rgb.shape[0], -1)
+
+
+CONVERTERS = {16: to_rgb565, 32: to_xrgb8888}
+
+
+class Framebuffer:
+    """Draws images directly into a Linux framebuffer, e.g. /dev/fb1.
+
+    The geometry of a framebuffer device is read from sysfs. For any other
+    path (e.g. a plain file), size and bits_per_pixel are used instead.
+    Only the rows which changed since the last frame are written.
+
+    Frames of another size are scaled to fit and centered with their aspect
+    ratio kept, as fbi -a shows them. With rotate, frames of the transposed
+    size are rotated by 90 degrees instead, so they fill the screen.
+    """
+
+    def __init__(
+        self, path="/dev/fb1", size=(480, 320), bits_per_pixel=16, rotate=False
+    ):
+        name = os.path.basename(os.path.realpath(path))
+        virtual_size = None
+        if stat.S_ISCHR(os.stat(path).st_mode):
+            virtual_size = _read_sysfs(name, "virtual_size")
+        if virtual_size is not None:
+            size = tuple(int(value) for value in virtual_size.split(","))
+            bits_per_pixel = int(_read_sysfs(name, "bits_per_pixel"))
+        if bits_per_pixel not in CONVERTERS:
+            raise ValueError(f"{bits_per_pixel} bits per pixel are not supported")
+        self.path = path
+        self.width, self.height = size
+        self.bits_per_pixel = bits_per_pixel
+        self.rotate = rotate
+        row_bytes = self.width * bits_per_pixel // 8
+        stride = _read_sysfs(name, "stride") if virtual_size else None
+        self.stride = int(stride) if stride else row_bytes
+        self.last_frame = None
+
+        length = self.stride * self.height
+        self._file = open(path, "r+b")
+        if os.path.isfile(path) and os.path.getsize(path) < length:
+            self._file.truncate(length)
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), length)
+        except Exception:
+            self._file.close()
+            raise
+        rows = np.ndarray((self.height, self.stride), np.uint8, self._mmap)
+        self._rows = rows[:, :row_bytes]
+        logger.info(
+            f"Framebuffer {path}: {self.width}x{self.height} {bits_per_pixel} bpp"
+        )
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def convert(self, image):
+        """Return the framebuffer rows of image."""
+        if self.rotate and image.size == (self.height, self.width):
+            image = image.transpose(Image.Transpose.ROTATE_90)
+        image = image.convert("RGB")
+        if image.size != self.size:
+            image = ImageOps.pad(image, self.size, color=(0, 0, 0))
+        rgb = np.asarray(image)
+        return CONVERTERS[self.bits_per_pixel](rgb)
+
+    def draw(self, image):
+        """Write image and return the number of written rows."""
+        frame = self.convert(image)
+        if self.last_frame is None:
+            rows = np.arange(self.height)
+        else:
+            rows = np.flatnonzero((frame != self.last_frame).any(axis=1))
+        if len(rows):
+            self._rows[rows] = frame[rows]
+        self.last_frame = frame
+        return len(rows)
+
+    def close(self):
+        self._rows = None
+        self._mmap.close()
+        self._file.close()
@@ -0,0 +1,120 @@
+import logging
+import time
+from datetime import datetime, timezone
+from math import ceil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Columns of the candle arrays, the timestamp is in ms as returned by ccxt
+TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+OHLC_KEYS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def interval_seconds(interval):
+    value = int(interval[:-1])
+    unit = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    return value * unit.get(interval[-1], 3600)
+
+
+def history_limit(days_ago, interval):
+    """Number of candles the price provider fetches for days_ago."""
+    return max(2, ceil(max(days_ago, 1) * 86400 / interval_seconds(interval)) + 1)
+
+
+def price_change(closes):
+    """Change from the first to the last close price, formatted like btcticker."""
+    if not len(closes) or closes[0] == 0:
+        return "0%"
+    change = (closes[-1] - closes[0]) / closes[0] * 100
+    return f"{change:+.1f}%"
+
+
+class CandleRing:
+    """Fixed capacity store of the newest OHLCV candles of one market.
+
+    The candles are appended to a buffer of twice the capacity. When it is
+    full, the newest candles are moved to its front, so that the newest n
+    candles are always contiguous and last(n) can return a view.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buffer = np.zeros((2 * capacity, 6))
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_timestamp(self):
+        if not len(self):
+            return None
+        return int(self._buffer[self._end - 1, TIMESTAMP])
+
+    def last(self, n=None):
+        """Read-only view of the newest n candles."""
+        n = len(self) if n is None else min(n, len(self))
+        view = self._buffer[self._end - n : self._end]
+        view.flags.writeable = False
+        return view
+
+    def merge(self, candles):
+        """Add candles sorted by time, candles with a known time replace it."""
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        if not len(candles):
+            return
+        candles = candles[-self.capacity :]
+        timestamps = self._buffer[self._start : self._end, TIMESTAMP]
+        self._end = self._start + int(np.searchsorted(timestamps, candles[0, 0]))
+        if self._end + len(candles) > len(self._buffer):
+            keep = min(len(self), self.capacity - len(candles))
+            self._buffer[:keep] = self._buffer[self._end - keep : self._end]
+            self._start, self._end = 0, keep
+        self._buffer[self._end : self._end + len(candles)] = candles
+        self._end += len(candles)
+
+
+class CandleHistory:
+    """Candle rings per symbol and interval, which are updated incrementally.
+
+    The first update of a ring fetches limit candles, the following ones
+    only fetch the candles since the newest stored one, which also updates
+    the candle that has not been closed yet.
+    """
+
+    def __init__(self):
+        self.rings = {}
+
+    def update(self, ccxt_exchange, symbol, interval, limit):
+        """Fetch the new candles and return the newest limit candles."""
+        ring = self.rings.get((symbol, interval))
+        since = None
+        if ring is not None and ring.capacity >= limit:
+            since = ring.last_timestamp
+        interval_ms = interval_seconds(interval) * 1000
+        now = time.time() * 1000
+        if since is None or now - since > (limit - 1) * interval_ms:
+            # Too old to be continued, all candles are fetched again
+            ring = self.rings[(symbol, interval)] = CandleRing(limit)
+            since = int(now - limit * interval_ms)
+            candles = ccxt_exchange.fetch_ohlcv(symbol, interval, since, limit)
+        else:
+            candles = ccxt_exchange.fetch_ohlcv(symbol, interval, since)
+        ring.merge([candle[:6] for candle in candles])
+        logger.info(f"Fetched {len(candles)} {interval} candles of {symbol}")
+        return ring.last(limit)
+
+
+def ohlc_rows(candles):
+    """Convert candles into the OHLC rows of the btcticker price providers."""
+    rows = []
+    for candle in candles.tolist():
+        row = dict(zip(OHLC_KEYS, candle[OPEN:], strict=True))
+        row["Timestamp"] = datetime.fromtimestamp(
+            candle[TIMESTAMP] / 1000, timezone.utc
+        )
+        rows.append(row)
+    return rows
@@ -0,0 +1,66 @@
+import logging
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class SharedSession:
+    """One pooled requests.Session for all data providers.
+
+    Connections are kept alive per host, at most pool_maxsize idle ones for
+    each of up to pool_connections hosts. stats() reports how many requests
+    reused a connection and how many connections were opened since the
+    last call.
+    """
+
+    def __init__(self, pool_connections=8, pool_maxsize=2, retries=3):
+        self.session = requests.Session()
+        # Same transport retries as pymempool uses for its own session
+        max_retries = urllib3.Retry(
+            total=retries,
+            backoff_factor=0.1,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries,
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._last_counts = (0, 0)
+
+    def install_mempool(self, mempool):
+        """Use the session for a btcticker Mempool or a pymempool MempoolAPI."""
+        api = getattr(mempool, "mempool", mempool)
+        api.session = self.session
+
+    def install_exchange(self, ccxt_exchange):
+        """Use the session for a ccxt exchange."""
+        ccxt_exchange.session = self.session
+
+    def counts(self):
+        """Total number of requests and opened connections of all pools."""
+        pools = self.adapter.poolmanager.pools
+        requests_count = connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        return requests_count, connections
+
+    def stats(self):
+        requests_count, connections = self.counts()
+        new_requests = max(0, requests_count - self._last_counts[0])
+        opened = max(0, connections - self._last_counts[1])
+        self._last_counts = (requests_count, connections)
+        return (
+            f"http: {new_requests} requests, {max(0, new_requests - opened)} "
+            f"reused, {opened} new connections"
+        )
@@ -0,0 +1,66 @@
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ButtonInput:
+    """Edge triggered button input.
+
+    The GPIO edge callbacks push the pin of every accepted key press into a
+    queue, so that the main loop can block until a key is pressed or its next
+    deadline is reached instead of polling the pins.
+    """
+
+    def __init__(self, gpio, pins, debounce=0.2):
+        self.gpio = gpio
+        self.pins = tuple(pins)
+        self.debounce = debounce
+        self.events = queue.Queue()
+        self._last_press = {}
+
+    def setup(self):
+        """(Re-)configure the pins and arm the edge detection.
+
+        Needs to be called again after the epd driver has released the GPIOs.
+        """
+        self.gpio.setmode(self.gpio.BCM)
+        for pin in self.pins:
+            self.gpio.setup(pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+            self.gpio.remove_event_detect(pin)
+            self.gpio.add_event_detect(
+                pin,
+                self.gpio.FALLING,
+                callback=self._on_edge,
+                bouncetime=int(self.debounce * 1000),
+            )
+
+    def _on_edge(self, pin):
+        now = time.monotonic()
+        last_press = self._last_press.get(pin)
+        if last_press is not None and now - last_press < self.debounce:
+            return
+        # A bouncing contact can trigger a falling edge without staying low
+        if self.gpio.input(pin) != self.gpio.LOW:
+            return
+        self._last_press[pin] = now
+        logger.debug(f"Button on GPIO {pin} pressed")
+        self.events.put(pin)
+
+    def wakeup(self):
+        """Let a blocking get() return None without a key press."""
+        self.events.put(None)
+
+    def get(self, timeout=None):
+        """Return the next pressed pin or None on timeout or wakeup."""
+        try:
+            if timeout is not None and timeout <= 0:
+                return self.events.get_nowait()
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        while not self.events.empty():
+            self.events.get_nowait()
@@ -0,0 +1,74 @@
+import logging
+import random
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LinkHealth:
+    """Tracks the connectivity from the result of the real data fetches.
+
+    After a failed fetch, the next attempt is delayed by an exponential
+    backoff with jitter. Before a fetch is retried while offline, probe()
+    checks the connection once per backoff window with a single TCP connect.
+    """
+
+    def __init__(
+        self,
+        base_delay=30,
+        max_delay=300,
+        jitter=0.5,
+        probe_address=("8.8.8.8", 53),
+        probe_timeout=5,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.probe_address = probe_address
+        self.probe_timeout = probe_timeout
+        self.failures = 0
+        self.offline_since = None
+        self.last_error = None
+
+    @property
+    def online(self):
+        return self.failures == 0
+
+    def offline_time(self):
+        """Seconds since the first failure, 0 while online."""
+        if self.offline_since is None:
+            return 0
+        return time.time() - self.offline_since
+
+    def record_success(self):
+        if self.failures:
+            logger.info(f"Link is back after {self.offline_time():.0f} s")
+        self.failures = 0
+        self.offline_since = None
+        self.last_error = None
+
+    def record_failure(self, error=None):
+        if self.offline_since is None:
+            self.offline_since = time.time()
+        self.failures += 1
+        self.last_error = error
+
+    def backoff(self):
+        """Delay until the next attempt after the recorded failures."""
+        if not self.failures:
+            return 0
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    def probe(self):
+        """Check the connection with one TCP connect and record a failure."""
+        try:
+            with socket.create_connection(
+                self.probe_address, timeout=self.probe_timeout
+            ):
+                return True
+        except OSError as e:
+            logger.info(f"Link probe failed: {e}")
+            self.record_failure(e)
+            return False
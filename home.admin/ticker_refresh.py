@@ -0,0 +1,426 @@
+import dataclasses
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+import ccxt
+from btcticker.domain import PriceSnapshot
+
+from ticker_endpoints import EndpointSelector, HedgedMempool
+from ticker_history import (
+    CLOSE,
+    CandleHistory,
+    history_limit,
+    ohlc_rows,
+    price_change,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """Immutable copy of everything Ticker.build() needs from the network.
+
+    candles is a read-only array of the OHLCV candles of days_ago days, see
+    ticker_history for its columns. market is the market_key() of the config
+    the prices were fetched with.
+    """
+
+    version: int
+    timestamp: float
+    mempool: dict
+    price: Any
+    price_now: str
+    price_change: str
+    days_ago: int
+    interval: str
+    candles: Any = field(default=None, compare=False)
+    market: str = ""
+
+    @property
+    def height(self):
+        return self.mempool["height"]
+
+    def age(self):
+        return time.time() - self.timestamp
+
+
+def fiat_symbol(config):
+    """Market of the fiat price, symbol or BTC/<fiat>."""
+    return (config.main.symbol or f"BTC/{config.main.fiat.upper()}").upper()
+
+
+def usd_symbol(config):
+    return (config.main.usd_symbol or "BTC/USD").upper()
+
+
+def market_key(config):
+    """Fiat, exchange and symbols of the prices, e.g.
+    "eur kraken BTC/EUR BTC/USD"."""
+    return " ".join(
+        (
+            config.main.fiat,
+            config.main.exchange,
+            fiat_symbol(config),
+            usd_symbol(config),
+        )
+    )
+
+
+def format_price(price):
+    """Price as shown by the btcticker price providers."""
+    if price is None:
+        return "0"
+    return f"{price:,.0f}" if price > 1000 else f"{price:.5g}"
+
+
+def _sats(price):
+    return 100_000_000 / price if price else None
+
+
+def _timestamp(ticker):
+    if ticker is None or ticker.get("timestamp") is None:
+        return None
+    return datetime.fromtimestamp(ticker["timestamp"] / 1000, timezone.utc)
+
+
+class PriceFeed:
+    """The ccxt exchange and the markets of the config.
+
+    Replaces the pyccxt price provider of btcticker, the markets are loaded
+    once and the prices and candles are fetched directly from ccxt. The usd
+    price is optional, it is skipped when the exchange has no such market.
+    """
+
+    def __init__(self, config):
+        provider = getattr(config.main, "price_provider", None) or "pyccxt"
+        provider = str(provider).strip().lower()
+        if provider != "pyccxt":
+            raise ValueError(
+                f"Unknown price provider '{provider}'. Available providers: pyccxt"
+            )
+        name = config.main.exchange.lower()
+        exchange_class = getattr(ccxt, name, None)
+        if exchange_class is None:
+            raise ValueError(f"Exchange '{name}' is not supported by ccxt")
+        self.exchange = exchange_class(
+            {"timeout": config.main.ccxt_timeout, "enableRateLimit": True}
+        )
+        self.fiat_symbol = fiat_symbol(config)
+        self.usd_symbol = usd_symbol(config)
+        self.interval = config.main.interval
+        self.markets = None
+
+    def load_markets(self):
+        if self.markets is not None:
+            return
+        markets = self.exchange.load_markets()
+        if self.fiat_symbol not in markets:
+            raise ValueError(
+                f"Market '{self.fiat_symbol}' not found on exchange "
+                f"'{self.exchange.id}'"
+            )
+        self.markets = markets
+
+    def fetch_price(self):
+        """Fetch the fiat and usd prices and return a PriceSnapshot."""
+        self.load_markets()
+        fiat_ticker = self.exchange.fetch_ticker(self.fiat_symbol)
+        if fiat_ticker.get("last") is None:
+            raise ValueError(f"Ticker data for '{self.fiat_symbol}' has no last price")
+        usd_ticker = None
+        if self.usd_symbol in self.markets:
+            usd_ticker = self.exchange.fetch_ticker(self.usd_symbol)
+        fiat_price = float(fiat_ticker["last"])
+        usd_price = None
+        if usd_ticker is not None and usd_ticker.get("last") is not None:
+            usd_price = float(usd_ticker["last"])
+        return PriceSnapshot(
+            fiat=self.fiat_symbol.split("/")[-1].lower(),
+            fiat_price=fiat_price,
+            usd_price=usd_price,
+            sat_per_fiat=_sats(fiat_price),
+            sat_per_usd=_sats(usd_price),
+            timestamp=_timestamp(fiat_ticker) or _timestamp(usd_ticker),
+        )
+
+
+class SnapshotMempool:
+    """Mempool replacement for Ticker, which serves a DataSnapshot."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.min_refresh_time = 0
+
+    def refresh(self):
+        pass
+
+    def getData(self):
+        if self.snapshot is None:
+            return {"height": -1}
+        return self.snapshot.mempool
+
+
+class SnapshotPriceProvider:
+    """Price provider for Ticker, which serves a DataSnapshot.
+
+    The snapshot can hold a longer history than days_ago, the price history,
+    the OHLC candles and the price change are then computed from a view of
+    the candles of the last days_ago days.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.days_ago = 1
+        self.min_refresh_time = 0
+
+    def set_days_ago(self, days_ago):
+        self.days_ago = days_ago
+
+    def set_min_refresh_time(self, min_refresh_time):
+        self.min_refresh_time = min_refresh_time
+
+    def refresh(self):
+        pass
+
+    def _window(self):
+        candles = self.snapshot.candles
+        if self.days_ago >= self.snapshot.days_ago:
+            return candles
+        return candles[-history_limit(self.days_ago, self.snapshot.interval) :]
+
+    def get_snapshot(self):
+        return self.snapshot.price
+
+    def get_price_now(self):
+        return self.snapshot.price_now
+
+    def get_price_change(self):
+        if self.days_ago >= self.snapshot.days_ago:
+            return self.snapshot.price_change
+        return price_change(self._window()[:, CLOSE])
+
+    def get_timeseries_list(self):
+        return self._window()[:, CLOSE].tolist()
+
+    def get_ohlc_history(self):
+        return ohlc_rows(self._window())
+
+
+def set_snapshot(ticker, snapshot):
+    """Let a Ticker created with the snapshot adapters render snapshot."""
+    ticker.mempool.snapshot = snapshot
+    ticker.price_provider.snapshot = snapshot
+
+
+class RefreshWorker(threading.Thread):
+    """Fetches the ticker data in the background.
+
+    Every interval seconds the mempool and price data are refreshed and
+    published as a new DataSnapshot. notify_height() refreshes the mempool
+    data in between, when a new block is reported. on_publish is called with
+    every new snapshot. When a LinkHealth is given as link, failed refreshes
+    are retried with its backoff instead of retry_interval and, while
+    offline, only after a successful probe. All requests use the
+    SharedSession session, when it is given.
+
+    The mempool data is fetched from the best ranked host of mempool_api_url,
+    see EndpointSelector. A refresh fails when it takes longer than
+    refresh_budget seconds, so an outage only delays the next attempt.
+
+    snapshot can be an older snapshot, e.g. from the disk cache, which is
+    served until the first refresh. When store is set, it is called with
+    every new snapshot to persist it.
+    """
+
+    def __init__(
+        self,
+        config,
+        interval,
+        days_ago=1,
+        retry_interval=30,
+        on_publish=None,
+        link=None,
+        session=None,
+        snapshot=None,
+        store=None,
+        refresh_budget=60,
+    ):
+        super().__init__(name="refresh", daemon=True)
+        self.config = config
+        self.interval = interval
+        self.days_ago = days_ago
+        self.retry_interval = retry_interval
+        self.on_publish = on_publish
+        self.link = link
+        self.session = session
+        self.store = store
+        self.refresh_budget = refresh_budget
+        self.endpoints = EndpointSelector(config.main.mempool_api_url)
+        self.mempool = None
+        self.price = None
+        self.history = CandleHistory()
+        self.last_error = None
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._next_refresh = 0
+        self._new_height = None
+
+    def get_snapshot(self):
+        with self._lock:
+            return self._snapshot
+
+    def data_age(self):
+        """Age of the newest price data in seconds, None without data."""
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.age()
+
+    def notify_height(self, height):
+        """Refresh the mempool data, when height is newer than the snapshot.
+
+        Can be called from any thread.
+        """
+        snapshot = self.get_snapshot()
+        if snapshot is not None and height > snapshot.height:
+            self._new_height = height
+            self._wakeup.set()
+
+    def request_refresh(self):
+        self._next_refresh = 0
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stopped:
+            now = time.time()
+            if now >= self._next_refresh:
+                if self.link is not None and not self.link.online:
+                    refreshed = self.link.probe() and self.refresh()
+                else:
+                    refreshed = self.refresh()
+                if refreshed:
+                    self._next_refresh = now + self.interval
+                elif self.link is not None:
+                    self._next_refresh = now + self.link.backoff()
+                else:
+                    self._next_refresh = now + self.retry_interval
+            elif self._new_height is not None:
+                self._new_height = None
+                self.refresh_height()
+            self._wakeup.wait(max(0, self._next_refresh - time.time()))
+            self._wakeup.clear()
+
+    def refresh(self):
+        self.endpoints.start_budget(self.refresh_budget)
+        try:
+            self.refresh_mempool()
+            if self.price is None:
+                self.price = PriceFeed(self.config)
+                if self.session is not None:
+                    self.session.install_exchange(self.price.exchange)
+            if self.endpoints.remaining() <= 0:
+                raise TimeoutError(f"Refresh took longer than {self.refresh_budget} s")
+            price, candles = self.refresh_price()
+            snapshot = DataSnapshot(
+                version=self._next_version(),
+                timestamp=time.time(),
+                mempool=dict(self.mempool.getData()),
+                price=price,
+                price_now=format_price(price.fiat_price),
+                price_change=price_change(candles[:, CLOSE]),
+                days_ago=self.days_ago,
+                interval=self.config.main.interval,
+                candles=candles,
+                market=market_key(self.config),
+            )
+        except Exception as e:
+            logger.warning(f"Refresh failed: {e}")
+            self.last_error = e
+            if self.link is not None:
+                self.link.record_failure(e)
+            return False
+        self.last_error = None
+        if self.link is not None:
+            self.link.record_success()
+        if self.session is not None:
+            logger.info(self.session.stats())
+        logger.info(self.endpoints.stats())
+        self._publish(snapshot)
+        return True
+
+    def refresh_mempool(self):
+        if self.mempool is None:
+            self.mempool = HedgedMempool(self.endpoints)
+            # Hedged requests which lost do not outlive the refresh
+            self.mempool.mempool.configure(reading_timeout=self.refresh_budget)
+            if self.session is not None:
+                self.mempool.mempool.configure(session=self.session.session)
+        self.mempool.refresh()
+
+    def refresh_price(self):
+        """Fetch the prices and the new candles, return them for a snapshot.
+
+        Replaces PyCCXTPriceProvider.refresh(), which fetches the whole price
+        history twice on every refresh. The candles serve the price chart and
+        the OHLC plot, so enable_ohlc is not needed.
+        """
+        price = self.price.fetch_price()
+        candles = self.history.update(
+            self.price.exchange,
+            self.price.fiat_symbol,
+            self.price.interval,
+            history_limit(self.days_ago, self.price.interval),
+        )
+        if not len(candles):
+            raise ValueError(f"Empty price history for '{self.price.fiat_symbol}'")
+        # The snapshot is read by the main thread, while the ring is updated
+        candles = candles.copy()
+        candles.flags.writeable = False
+        return price, candles
+
+    def refresh_height(self):
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return
+        self.endpoints.start_budget(self.refresh_budget)
+        try:
+            self.refresh_mempool()
+            mempool = dict(self.mempool.getData())
+        except Exception as e:
+            logger.warning(f"Mempool refresh failed: {e}")
+            if self.link is not None:
+                self.link.record_failure(e)
+            return
+        if mempool["height"] != snapshot.height:
+            self._publish(
+                dataclasses.replace(
+                    snapshot, version=self._next_version(), mempool=mempool
+                )
+            )
+
+    def _next_version(self):
+        snapshot = self.get_snapshot()
+        return 1 if snapshot is None else snapshot.version + 1
+
+    def _publish(self, snapshot):
+        with self._lock:
+            self._snapshot = snapshot
+        logger.info(f"Published data version {snapshot.version}")
+        if self.on_publish is not None:
+            self.on_publish(snapshot)
+        if self.store is not None:
+            try:
+                self.store(snapshot)
+            except Exception as e:
+                logger.warning(f"Storing data version {snapshot.version} failed: {e}")
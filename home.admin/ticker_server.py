@@ -0,0 +1,271 @@
+import hashlib
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from urllib.parse import parse_qs, urlsplit
+
+# Defers the chart imports of the worker processes
+import ticker_startup  # noqa: F401
+from ticker_buffer import pack_image
+from ticker_cache import FrameCache
+from ticker_epd import PANELS, display_size, get_panel
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = (
+    "all",
+    "fiat",
+    "fiatheight",
+    "big_one_row",
+    "big_two_rows",
+    "one_number",
+    "mempool",
+    "ohlc",
+)
+MODES = ("fiat", "height", "satfiat", "usd", "newblock", "moscowtime")
+FORMATS = ("png", "buffer")
+ORIENTATIONS = (0, 90, 180, 270)
+# A request waits this long for its frame before it fails
+RENDER_TIMEOUT = 60
+
+# The config and the Tickers per display size of a worker process
+_config = None
+_tickers = {}
+
+
+def _init_worker(config_path):
+    from btcticker.config import Config
+
+    import ticker_chart
+    from ticker_config import load_daemon_config
+
+    global _config
+    _config = Config(path=config_path)
+    if load_daemon_config(_config).chart_engine == "native":
+        ticker_chart.install()
+
+
+def _get_ticker(width, height):
+    from btcticker.ticker import Ticker
+
+    from ticker_refresh import SnapshotMempool, SnapshotPriceProvider
+
+    ticker = _tickers.get((width, height))
+    if ticker is None:
+        ticker = _tickers[(width, height)] = Ticker(
+            _config,
+            width,
+            height,
+            mempool=SnapshotMempool(),
+            price_provider=SnapshotPriceProvider(),
+        )
+    return ticker
+
+
+def render_frame(view, snapshot):
+    """Render view in a worker process, return the PNG or the panel buffer.
+
+    The buffer of a panel with a black and a red plane contains the black
+    plane followed by the red one.
+    """
+    from ticker_refresh import set_snapshot
+
+    epd_type, orientation, mode, layout, days, inverted, output = view
+    panel = get_panel(epd_type)
+    ticker = _get_ticker(*display_size(panel, orientation))
+    set_snapshot(ticker, snapshot)
+    ticker.set_days_ago(days)
+    ticker.orientation = orientation
+    ticker.inverted = inverted
+    ticker.build(mode=mode, layout=layout, mirror=False)
+    image = ticker.get_image()
+    if output == "buffer":
+        buffer = pack_image(panel, image)
+        if isinstance(buffer, tuple):
+            return b"".join(buffer)
+        return bytes(buffer)
+    data = io.BytesIO()
+    image.save(data, format="PNG")
+    return data.getvalue()
+
+
+class FrameServer:
+    """Renders the snapshots of a RefreshWorker for any number of displays.
+
+    A view is (epd_type, orientation, mode, layout, days, inverted, output).
+    The frames are rendered by a pool of worker processes, each keeps a
+    Ticker per display size, and cached as encoded bytes for the current
+    data version. Requests for a frame which is being rendered wait for the
+    same result.
+    """
+
+    def __init__(self, worker, config_path, defaults, max_days, workers, max_bytes):
+        self.worker = worker
+        self.defaults = defaults
+        self.max_days = max_days
+        self.frame_cache = FrameCache(max_bytes, size=len)
+        self.rendered = 0
+        self._pending = {}
+        # The done callback of a render runs right away when it is finished
+        self._lock = threading.RLock()
+        # Worker processes are not forked from the threads of the server
+        self._pool = ProcessPoolExecutor(
+            workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config_path,),
+        )
+
+    def parse_view(self, query):
+        """View of the query parameters, missing ones are taken from defaults.
+
+        Raises ValueError for unknown or invalid values.
+        """
+        values = dict(self.defaults)
+        values.update({name: value[-1] for name, value in query.items()})
+        epd_type = values["epd_type"]
+        if epd_type not in PANELS:
+            raise ValueError(f"Unknown epd_type '{epd_type}'")
+        orientation = int(values["orientation"])
+        if orientation not in ORIENTATIONS:
+            raise ValueError(f"orientation has to be one of {ORIENTATIONS}")
+        if values["mode"] not in MODES:
+            raise ValueError(f"Unknown mode '{values['mode']}'")
+        if values["layout"] not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{values['layout']}'")
+        days = int(values["days"])
+        if not 1 <= days <= self.max_days:
+            raise ValueError(f"days has to be between 1 and {self.max_days}")
+        inverted = str(values["inverted"]).lower() in ("1", "true", "yes")
+        if values["format"] not in FORMATS:
+            raise ValueError(f"format has to be one of {FORMATS}")
+        return (
+            epd_type,
+            orientation,
+            values["mode"],
+            values["layout"],
+            days,
+            inverted,
+            values["format"],
+        )
+
+    def etag(self, view, snapshot):
+        """ETag of view, it changes with every new snapshot."""
+        key = repr((view, snapshot.version, snapshot.timestamp))
+        return f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+    def frame(self, view, snapshot):
+        """Return the bytes of view for snapshot."""
+        key = view + (snapshot.version,)
+        with self._lock:
+            # Frames of older data are never requested again
+            self.frame_cache.retain(lambda cached: cached[-1] >= snapshot.version)
+            data = self.frame_cache.get(key)
+            if data is not None:
+                return data
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._pool.submit(
+                    render_frame, view, snapshot
+                )
+                future.add_done_callback(lambda done: self._rendered(key, done))
+        return future.result(timeout=RENDER_TIMEOUT)
+
+    def _rendered(self, key, future):
+        with self._lock:
+            del self._pending[key]
+            if not future.cancelled() and future.exception() is None:
+                self.frame_cache.put(key, future.result())
+                self.rendered += 1
+
+    def status(self):
+        snapshot = self.worker.get_snapshot()
+        with self._lock:
+            frames = {
+                "cached": len(self.frame_cache),
+                "cached_kb": round(self.frame_cache.used_bytes / 1024),
+                "hits": self.frame_cache.hits,
+                "misses": self.frame_cache.misses,
+                "rendered": self.rendered,
+                "rendering": len(self._pending),
+            }
+        return {
+            "version": None if snapshot is None else snapshot.version,
+            "data_age": self.worker.data_age(),
+            "last_error": (
+                None if self.worker.last_error is None else str(self.worker.last_error)
+            ),
+            "frames": frames,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+
+
+class FrameHandler(BaseHTTPRequestHandler):
+    """GET /frame?epd_type=...&format=png|buffer and GET /status."""
+
+    server_version = "btcticker"
+
+    def do_GET(self):
+        frames = self.server.frames
+        url = urlsplit(self.path)
+        if url.path == "/status":
+            body = json.dumps(frames.status()).encode()
+            return self._send(200, body, "application/json")
+        if url.path != "/frame":
+            return self.send_error(404)
+        try:
+            view = frames.parse_view(parse_qs(url.query))
+        except (KeyError, ValueError) as e:
+            return self.send_error(400, str(e))
+        snapshot = frames.worker.get_snapshot()
+        if snapshot is None:
+            return self.send_error(503, "No data yet")
+        etag = frames.etag(view, snapshot)
+        if etag in self.headers.get("If-None-Match", ""):
+            return self._send(304, etag=etag)
+        try:
+            data = frames.frame(view, snapshot)
+        except Exception as e:
+            logger.warning(f"Rendering {view} failed: {e}")
+            return self.send_error(500, "Rendering failed")
+        if view[-1] == "png":
+            return self._send(200, data, "image/png", etag)
+        panel = get_panel(view[0])
+        headers = {
+            "X-Panel-Width": panel.width,
+            "X-Panel-Height": panel.height,
+            "X-Panel-Color": panel.color,
+        }
+        return self._send(200, data, "application/octet-stream", etag, headers)
+
+    def _send(self, status, body=b"", content_type=None, etag=None, headers=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            # Clients have to revalidate, the frame changes with the data
+            self.send_header("Cache-Control", "no-cache")
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class FrameHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, frames):
+        super().__init__(address, FrameHandler)
+        self.frames = frames
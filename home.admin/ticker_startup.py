@@ -0,0 +1,151 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+import types
+
+STARTED = time.perf_counter()
+CHART_MODULE = "btcticker.chart"
+PROFILE_OPTION = "--startup-profile"
+
+logger = logging.getLogger(__name__)
+
+
+class LazyChart(types.ModuleType):
+    """Stand-in for btcticker.chart, which imports it for the first chart.
+
+    btcticker.chart imports matplotlib, mplfinance and pandas, which take
+    most of the startup time on a Pi Zero, but only the all, fiat and ohlc
+    layouts draw a chart.
+    """
+
+    def __init__(self):
+        super().__init__(CHART_MODULE)
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                del sys.modules[CHART_MODULE]
+                try:
+                    self._module = importlib.import_module(CHART_MODULE)
+                except BaseException:
+                    sys.modules[CHART_MODULE] = self
+                    raise
+                logger.info(
+                    f"Imported the chart modules in {time.perf_counter() - start:.2f} s"
+                )
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def makeSpark(self, *args, **kwargs):
+        return self._load().makeSpark(*args, **kwargs)
+
+    def makeCandle(self, *args, **kwargs):
+        return self._load().makeCandle(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+
+def defer_chart_import():
+    """Replace btcticker.chart by a LazyChart, unless it was imported already."""
+    chart = sys.modules.get(CHART_MODULE)
+    if chart is None:
+        chart = sys.modules[CHART_MODULE] = LazyChart()
+    return chart
+
+
+class ImportProfiler:
+    """Records the time of every module import, like python -X importtime.
+
+    total includes the time of the modules imported by a module, self_time
+    does not. Only the imports of the main thread are recorded.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._children = []
+        self._thread = threading.main_thread()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Builtin and frozen modules are loaded by classes, not instances
+        if loader is not None and not isinstance(loader, type):
+            exec_module = getattr(loader, "exec_module", None)
+            if exec_module is not None and not hasattr(exec_module, "profiled"):
+                loader.exec_module = self._timed(exec_module)
+        return spec
+
+    def _timed(self, exec_module):
+        def timed_exec_module(module):
+            if threading.current_thread() is not self._thread:
+                return exec_module(module)
+            self._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                children = self._children.pop()
+                if self._children:
+                    self._children[-1] += total
+                self.times[module.__name__] = (total, total - children)
+
+        timed_exec_module.profiled = True
+        return timed_exec_module
+
+    def report(self, limit=25):
+        """Lines with the slowest imports by their own time."""
+        imports = sorted(self.times.items(), key=lambda item: -item[1][1])
+        total = sum(self_time for _, self_time in self.times.values())
+        lines = [
+            f"Imported {len(self.times)} modules in {total:.2f} s, the slowest:",
+            f"{'self ms':>9} {'total ms':>9}  module",
+        ]
+        for name, (module_total, self_time) in imports[:limit]:
+            lines.append(f"{self_time * 1000:9.1f} {module_total * 1000:9.1f}  {name}")
+        return lines
+
+
+# This module has to be imported before btcticker. The option is parsed later
+# by argparse, but the imports happen before.
+profiler = ImportProfiler().install() if PROFILE_OPTION in sys.argv else None
+chart = defer_chart_import()
+_first_frame = False
+
+
+def uptime():
+    return time.perf_counter() - STARTED
+
+
+def first_frame_shown():
+    """Log the time to the first frame once, print the import profile."""
+    global _first_frame
+    if _first_frame:
+        return
+    _first_frame = True
+    logger.info(f"First frame after {uptime():.2f} s")
+    if profiler is not None:
+        print(f"First frame after {uptime():.2f} s")
+        print("\n".join(profiler.report()))
@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+from btcticker.domain import PriceSnapshot
+
+from ticker_refresh import DataSnapshot, market_key
+
+logger = logging.getLogger(__name__)
+
+# Increased whenever the layout of the stored snapshot changes
+FORMAT_VERSION = 3
+
+
+def _to_json(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    raise TypeError(f"{type(value).__name__} cannot be stored")
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return np.nan if value is None else float(value)
+
+
+def _datetime(value):
+    if value is None or np.isnan(value):
+        return None
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+def save_snapshot(path, snapshot):
+    """Store snapshot in a compressed numpy archive at path.
+
+    The file is replaced atomically, no pickles are used.
+    """
+    price = snapshot.price
+    meta = {
+        "format": FORMAT_VERSION,
+        "version": snapshot.version,
+        "timestamp": snapshot.timestamp,
+        "mempool": snapshot.mempool,
+        "price": {
+            "fiat": price.fiat,
+            "fiat_price": price.fiat_price,
+            "usd_price": price.usd_price,
+            "sat_per_fiat": price.sat_per_fiat,
+            "sat_per_usd": price.sat_per_usd,
+            "timestamp": _timestamp(price.timestamp),
+        },
+        "price_now": snapshot.price_now,
+        "price_change": snapshot.price_change,
+        "days_ago": snapshot.days_ago,
+        "interval": snapshot.interval,
+        "market": snapshot.market,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f,
+                meta=np.frombuffer(
+                    json.dumps(meta, default=_to_json).encode(), dtype=np.uint8
+                ),
+                candles=np.asarray(snapshot.candles, dtype=np.float64),
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_snapshot(path):
+    """Return the DataSnapshot stored at path, None when there is none."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta["format"] != FORMAT_VERSION:
+                return None
+            candles = data["candles"].reshape(-1, 6)
+        candles.flags.writeable = False
+        price = dict(meta["price"], timestamp=_datetime(meta["price"]["timestamp"]))
+        return DataSnapshot(
+            version=meta["version"],
+            timestamp=meta["timestamp"],
+            mempool=meta["mempool"],
+            price=PriceSnapshot(**price),
+            price_now=meta["price_now"],
+            price_change=meta["price_change"],
+            days_ago=meta["days_ago"],
+            interval=meta["interval"],
+            candles=candles,
+            market=meta["market"],
+        )
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Cannot load the cached data from {path}: {e}")
+        return None
+
+
+def load_cached_snapshot(path, config, days_ago, max_age):
+    """Return the DataSnapshot stored at path, when it fits config.
+
+    None when there is none, or when it has fewer than days_ago days, another
+    interval or market, or is older than max_age seconds.
+    """
+    snapshot = load_snapshot(path)
+    if snapshot is None or (
+        snapshot.days_ago < days_ago
+        or snapshot.interval != config.main.interval
+        or snapshot.market != market_key(config)
+        or snapshot.age() > max_age
+    ):
+        return None
+    return snapshot
@@ -1,39 +1,48 @@
+import argparse
 import logging
+import os
+import sys
 
 from btcticker.config import Config
-from btcticker.ticker import Ticker
 
-logger = logging.getLogger(__name__)
-
-
-config = Config("home.admin/config.ini")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "dev"))
 
-w = 176
-h = 264
+from bench_render import LAYOUTS, MODES, SIZES, cases, make_ticker  # noqa: E402
+from ticker_config import load_daemon_config  # noqa: E402
 
-ticker = Ticker(config, w, h)
-ticker.orientation = 0
-
-ticker.setDaysAgo(3)
-ticker.refresh()
+logger = logging.getLogger(__name__)
 
-mode_list = "fiat,height,satfiat,moscowtime,usd".split(",")
-layout_list = (
-    "all,fiat,fiatheight,big_one_row,one_number,big_two_rows,mempool,ohlc".split(",")
+parser = argparse.ArgumentParser(
+    description="Render every frame once from the offline fixture"
 )
-size_list = [
-    (122, 250, 0),
-    (176, 264, 0),
-    (128, 296, 0),
-    (480, 280, 0),
-    (480, 800, 0),
-    (800, 480, 0),
-]
-
-for w, h, o in size_list:
-    ticker._change_size(w, h)
+parser.add_argument("--config", default=os.path.join(ROOT, "home.admin/config.ini"))
+parser.add_argument("--chart-engine", choices=("matplotlib", "native"))
+args = parser.parse_args()
+
+# Renders every frame once from the offline fixture, dev/bench_render.py
+# measures them
+config = Config(path=args.config)
+chart_engine = args.chart_engine or load_daemon_config(config).chart_engine
+ticker = make_ticker(config, chart_engine)
+
+layouts = LAYOUTS
+if chart_engine == "matplotlib":
+    # mplfinance does not accept the OHLC rows of btcticker, a known upstream
+    # failure which the native engine does not have
+    layouts = [layout for layout in LAYOUTS if layout != "ohlc"]
+    print("Skipped the ohlc layout, it fails with the matplotlib chart engine")
+
+failed = []
+for w, h, o, layout, mode in cases(SIZES, (0,), layouts, MODES):
+    ticker.change_size(w, h)
     ticker.orientation = o
-    for layout in layout_list:
-        for mode in mode_list:
-            ticker.build(mirror=False, mode=mode, layout=layout)
-            ticker.get_image()
+    try:
+        ticker.build(mirror=False, mode=mode, layout=layout)
+        ticker.get_image()
+    except Exception as e:
+        failed.append(f"{w}x{h} {layout} {mode}: {e}")
+
+for failure in failed:
+    print(failure)
+sys.exit(1 if failed else 0)
@@ -1,13 +1,32 @@
 import io
 import logging
-import time
+import os
+import sys
+import threading
 
 import FreeSimpleGUI as sg
 from btcticker.config import Config
 from btcticker.ticker import Ticker
 
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "home.admin")
+)
+
+from ticker_archive import install_archive  # noqa: E402
+from ticker_refresh import (  # noqa: E402
+    RefreshWorker,
+    SnapshotMempool,
+    SnapshotPriceProvider,
+    set_snapshot,
+)
+
 logger = logging.getLogger(__name__)
 
+# Every view is shown this long, the data is refreshed independently
+VIEW_TIME = 3
+REFRESH_INTERVAL = 120
+FRAME_EVENT = "-FRAME-"
+
 
 def get_display_size(epd_type="2in7_4gray"):
     if epd_type == "2in7":
@@ -27,9 +46,9 @@ def get_display_size(epd_type="2in7_4gray"):
 
 
 def get_img_data(img):
-    """Generate image data using PIL."""
+    """Generate image data using PIL, as uncompressed PPM which Tk reads."""
     bio = io.BytesIO()
-    img.save(bio, format="PNG")
+    img.convert("RGB").save(bio, format="PPM")
     del img
     return bio.getvalue()
 
@@ -48,12 +67,19 @@ config.main.interval = "1h"
 config.main.orientation = 90
 config.main.orientation = 0
 
+install_archive(config)
+
+# The ticker renders the snapshots of the refresh worker
+snapshot_data = {
+    "mempool": SnapshotMempool(),
+    "price_provider": SnapshotPriceProvider(),
+}
 if config.main.orientation == 90:
-    ticker = Ticker(config, h, w)
+    ticker = Ticker(config, h, w, **snapshot_data)
 elif config.main.orientation == 270:
-    ticker = Ticker(config, h, w)
+    ticker = Ticker(config, h, w, **snapshot_data)
 else:
-    ticker = Ticker(config, w, h)
+    ticker = Ticker(config, w, h, **snapshot_data)
 
 mode_list = ["fiat", "height", "satfiat", "usd", "newblock", "moscowtime"]
 # mode_list = []
@@ -83,12 +109,49 @@ for layout in config.main.layout_list.split(","):
 layout_ind = 0  # config.main.start_layout_ind
 layout_shifting = True  # config.main.layout_shifting
 
-ticker.set_days_ago(days_list[days_ind])
-ticker.refresh()
-ticker.build(mirror=False, mode=mode_list[ticker_ind], layout=layout_list[layout_ind])
-ticker.set_min_refresh_time(120)
 
-image_elem = sg.Image(data=get_img_data(ticker.get_image()))
+def next_view():
+    global ticker_ind, layout_ind, days_ind
+    ticker_ind += 1
+    if ticker_ind >= len(mode_list) or not mode_shifting:
+        ticker_ind = 0
+        layout_ind += 1
+        if layout_ind >= len(layout_list) or not layout_shifting:
+            layout_ind = 0
+            days_ind += 1
+            if days_ind >= len(days_list) or not days_shifting:
+                days_ind = 0
+
+
+def produce_frames(window, stop):
+    """Render the views in turn from the latest data, off the GUI thread.
+
+    The finished frames are passed to the GUI as FRAME_EVENT.
+    """
+    while not stop.is_set():
+        snapshot = worker.get_snapshot()
+        if snapshot is None:
+            stop.wait(0.1)
+            continue
+        print(
+            f"Running loop with mode: {mode_list[ticker_ind]} "
+            f"layout: {layout_list[layout_ind]}"
+        )
+        set_snapshot(ticker, snapshot)
+        ticker.set_days_ago(days_list[days_ind])
+        ticker.build(
+            mirror=False, mode=mode_list[ticker_ind], layout=layout_list[layout_ind]
+        )
+        window.write_event_value(FRAME_EVENT, get_img_data(ticker.get_image()))
+        next_view()
+        stop.wait(VIEW_TIME)
+
+
+# The longest history is fetched, shorter ones are sliced from it
+worker = RefreshWorker(config, REFRESH_INTERVAL, days_ago=max(days_list))
+worker.start()
+
+image_elem = sg.Image(size=(ticker.width, ticker.height))
 
 col = [[image_elem]]
 
@@ -101,40 +164,23 @@ window = sg.Window(
     return_keyboard_events=True,
     location=(0, 0),
     use_default_focus=False,
+    finalize=True,
 )
 
-# loop reading the user input and displaying image, filename
-i = 0
+stop = threading.Event()
+producer = threading.Thread(target=produce_frames, args=(window, stop), daemon=True)
+producer.start()
 
+# loop reading the user input and displaying the finished frames
 while True:
-    # read the form
-    event, values = window.read(timeout=3000)
-    # perform button and keyboard operations
+    event, values = window.read()
     if event == sg.WIN_CLOSED:
         break
-    elif event == sg.TIMEOUT_EVENT:
-        ticker_ind += 1
-        if ticker_ind >= len(mode_list) or not mode_shifting:
-            ticker_ind = 0
-            layout_ind += 1
-            if layout_ind >= len(layout_list) or not layout_shifting:
-                layout_ind = 0
-                days_ind += 1
-                if days_ind >= len(days_list) or not days_shifting:
-                    days_ind = 0
-
-        print(
-            f"Running loop with mode: {mode_list[ticker_ind]}"
-            f"layout: {layout_list[layout_ind]}"
-        )
-        ticker.set_days_ago(days_list[days_ind])
-        ticker.refresh()
-        ticker.build(
-            mirror=False, mode=mode_list[ticker_ind], layout=layout_list[layout_ind]
-        )
+    elif event == FRAME_EVENT:
         # update window with new image
-        image_elem.update(data=get_img_data(ticker.get_image()))
-        time.sleep(2)
-
+        image_elem.update(data=values[FRAME_EVENT])
 
+stop.set()
+worker.stop()
+producer.join()
 window.close()
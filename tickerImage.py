@@ -1,8 +1,14 @@
+import hashlib
 import io
 import logging
+import os
+import sys
+import time
 from io import BytesIO
 
 import typer
+from btcticker.config import Config
+from btcticker.ticker import Ticker
 from libsixel import (
     SIXEL_BUILTIN_G1,
     SIXEL_BUILTIN_G8,
@@ -23,12 +29,20 @@ from libsixel import (
 )
 from rich.console import Console
 
-from btcticker.config import Config
-from btcticker.ticker import Ticker
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "home.admin")
+)
+
+from ticker_archive import install_archive  # noqa: E402
 
 logger = logging.getLogger(__name__)
 console = Console()
 
+# Moves the cursor home, so that every frame is drawn over the last one
+CURSOR_HOME = "\x1b[H"
+CLEAR_SCREEN = "\x1b[2J"
+CLEAR_LINE = "\x1b[K"
+
 
 def get_display_size(epd_type="2in7_4gray"):
     if epd_type == "2in7":
@@ -53,12 +67,98 @@ def get_img_data(img):
     return bio.getvalue()
 
 
+class SixelEncoder:
+    """Encodes the frames to sixel, keeping the output between frames.
+
+    A frame equal to the last one is not encoded again. The dithers of the
+    modes with a fixed palette are kept as well. RGB and RGBA frames get a
+    new dither when they change, as its palette is computed from the frame.
+    """
+
+    def __init__(self):
+        self.buffer = BytesIO()
+        self.output = sixel_output_new(lambda data, s: s.write(data), self.buffer)
+        self.dithers = {}
+        self.frame_hash = None
+        self.encoded = 0
+        self.skipped = 0
+
+    def _dither(self, image, data):
+        """Return the dither for image and whether it has to be unreferenced."""
+        width, height = image.size
+        if image.mode in ("RGBA", "RGB"):
+            dither = sixel_dither_new(256)
+            if image.mode == "RGBA":
+                pixelformat = SIXEL_PIXELFORMAT_RGBA8888
+            else:
+                pixelformat = SIXEL_PIXELFORMAT_RGB888
+            sixel_dither_initialize(dither, data, width, height, pixelformat)
+            return dither, True
+        dither = self.dithers.get(image.mode)
+        if dither is None:
+            if image.mode == "P":
+                dither = sixel_dither_new(256)
+                sixel_dither_set_pixelformat(dither, SIXEL_PIXELFORMAT_PAL8)
+            elif image.mode == "L":
+                dither = sixel_dither_get(SIXEL_BUILTIN_G8)
+                sixel_dither_set_pixelformat(dither, SIXEL_PIXELFORMAT_G8)
+            elif image.mode == "1":
+                dither = sixel_dither_get(SIXEL_BUILTIN_G1)
+                sixel_dither_set_pixelformat(dither, SIXEL_PIXELFORMAT_G1)
+            else:
+                raise RuntimeError("unexpected image mode")
+            self.dithers[image.mode] = dither
+        if image.mode == "P":
+            sixel_dither_set_palette(dither, image.getpalette())
+        return dither, False
+
+    def encode(self, image):
+        """Return the sixel string of image, None when the frame is unchanged."""
+        width, height = image.size
+        try:
+            data = image.tobytes()
+        except NotImplementedError:
+            data = image.tostring()
+        frame_hash = hashlib.blake2b(data, digest_size=16)
+        frame_hash.update(f"{image.mode} {width}x{height}".encode())
+        if frame_hash.digest() == self.frame_hash:
+            self.skipped += 1
+            return None
+        dither, unref = self._dither(image, data)
+        try:
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            sixel_encode(data, width, height, 1, dither, self.output)
+        finally:
+            if unref:
+                sixel_dither_unref(dither)
+        self.frame_hash = frame_hash.digest()
+        self.encoded += 1
+        return self.buffer.getvalue().decode("ascii")
+
+    def close(self):
+        for dither in self.dithers.values():
+            sixel_dither_unref(dither)
+        self.dithers.clear()
+        sixel_output_unref(self.output)
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+
 def main(
     layout_ind: int = typer.Argument(default=0),
     mode_ind: int = typer.Argument(default=0),
     days: int = typer.Argument(default=1),
     orientation: int = typer.Argument(default=0),
     epd_type: str = typer.Argument(default="2in7_V2"),
+    watch: bool = typer.Option(
+        False, help="keep rendering, a frame is only sent when it changed"
+    ),
+    interval: float = typer.Option(10.0, help="seconds between frames with --watch"),
+    refresh: int = typer.Option(120, help="seconds between refreshes with --watch"),
+    timing: bool = typer.Option(False, help="print the times of every frame"),
 ):
     layout_list = [
         "all",
@@ -76,15 +176,12 @@ def main(
     config = Config("home.admin/config.ini")
     config.main.epd_type = epd_type
     h, w = get_display_size(epd_type=config.main.epd_type)
-    if layout == "ohlc":
-        config.main.enable_ohlc = True
-        config.main.price_service = "coingecko"
-    else:
-        config.main.enable_ohlc = False
-        config.main.price_service = "coinpaprika"
+    config.main.enable_ohlc = layout == "ohlc"
     config.main.interval = "1h"
     config.main.orientation = orientation
 
+    install_archive(config)
+
     if config.main.orientation == 90:
         ticker = Ticker(config, h, w)
     elif config.main.orientation == 270:
@@ -93,53 +190,52 @@ def main(
         ticker = Ticker(config, w, h)
 
     ticker.set_days_ago(days)
-    ticker.refresh()
+    ticker.set_min_refresh_time(refresh)
 
-    s = BytesIO()
     print(
         f"Creating image for h: {h}, w: {w}, o: {ticker.orientation} "
         f"with mode: {mode} layout: {layout}"
     )
-    ticker.build(mirror=False, mode=mode, layout=layout)
-    image = ticker.get_image()
-    width, height = image.size
+    encoder = SixelEncoder()
+    if watch:
+        sys.stdout.write(CLEAR_SCREEN)
     try:
-        data = image.tobytes()
-    except NotImplementedError:
-        data = image.tostring()
-    output = sixel_output_new(lambda data, s: s.write(data), s)
-
-    try:
-        if image.mode == "RGBA":
-            dither = sixel_dither_new(256)
-            sixel_dither_initialize(
-                dither, data, width, height, SIXEL_PIXELFORMAT_RGBA8888
-            )
-        elif image.mode == "RGB":
-            dither = sixel_dither_new(256)
-            sixel_dither_initialize(
-                dither, data, width, height, SIXEL_PIXELFORMAT_RGB888
-            )
-        elif image.mode == "P":
-            palette = image.getpalette()
-            dither = sixel_dither_new(256)
-            sixel_dither_set_palette(dither, palette)
-            sixel_dither_set_pixelformat(dither, SIXEL_PIXELFORMAT_PAL8)
-        elif image.mode == "L":
-            dither = sixel_dither_get(SIXEL_BUILTIN_G8)
-            sixel_dither_set_pixelformat(dither, SIXEL_PIXELFORMAT_G8)
-        elif image.mode == "1":
-            dither = sixel_dither_get(SIXEL_BUILTIN_G1)
-            sixel_dither_set_pixelformat(dither, SIXEL_PIXELFORMAT_G1)
-        else:
-            raise RuntimeError("unexpected image mode")
-        try:
-            sixel_encode(data, width, height, 1, dither, output)
-            print(s.getvalue().decode("ascii"))
-        finally:
-            sixel_dither_unref(dither)
+        while True:
+            start = time.perf_counter()
+            try:
+                ticker.refresh()
+            except Exception as e:
+                if not watch:
+                    raise
+                # A dropped request must not end the watch
+                logger.warning(f"Refresh failed, keeping the last frame: {e}")
+                time.sleep(interval)
+                continue
+            refreshed = time.perf_counter()
+            ticker.build(mirror=False, mode=mode, layout=layout)
+            image = ticker.get_image()
+            rendered = time.perf_counter()
+            sixel = encoder.encode(image)
+            encoded = time.perf_counter()
+            if sixel is not None:
+                sys.stdout.write(CURSOR_HOME + sixel if watch else sixel + "\n")
+            if timing:
+                encode_time = _ms(encoded - rendered) if sixel else "unchanged"
+                # With --watch, the line below the frame is overwritten
+                end = "" if watch else "\n"
+                sys.stdout.write(
+                    f"\rrefresh {_ms(refreshed - start)} "
+                    f"render {_ms(rendered - refreshed)} "
+                    f"encode {encode_time}{CLEAR_LINE}{end}"
+                )
+            sys.stdout.flush()
+            if not watch:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
     finally:
-        sixel_output_unref(output)
+        encoder.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 import io
 import logging
+import os
+import sys
 
 import typer
 from rich.console import Console
@@ -8,6 +10,12 @@ from rich.table import Table
 from btcticker.config import Config
 from btcticker.ticker import Ticker
 
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "home.admin")
+)
+
+from ticker_archive import install_archive  # noqa: E402
+
 logger = logging.getLogger(__name__)
 console = Console()
 
@@ -61,6 +69,8 @@ def main(
     config.main.interval = "1h"
     config.main.orientation = 90
 
+    install_archive(config)
+
     if config.main.orientation == 90:
         ticker = Ticker(config, h, w)
     elif config.main.orientation == 270: